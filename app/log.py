@@ -0,0 +1,198 @@
+import atexit
+import copy
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+import traceback
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+from app.services import metrics
+
+# Structured logging that never blocks the event loop. Records go onto an
+# in-memory queue (dropped, and counted, if it is full) and a background
+# listener thread writes them to stdout as JSON lines. Each record carries
+# the current request's id, route template, latency so far and a hashed
+# user key, taken from context variables bound by RequestLogMiddleware.
+#
+# LOG_SAMPLE_RATES keeps a fraction of the records below WARNING from hot
+# loggers, e.g. "app.access=0.1,app.services.harvest_prediction=0.5"; the longest
+# matching logger-name prefix wins.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+
+def _parse_rates(spec: str) -> Dict[str, float]:
+    rates = {}
+    for part in spec.split(","):
+        name, _, rate = part.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+SAMPLE_RATES = _parse_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+
+# Attributes every LogRecord has; anything else was passed as `extra`
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "exception"}
+
+
+class RequestContext:
+    __slots__ = ("request_id", "scope", "user_key", "start")
+
+    def __init__(self, request_id: str, scope: dict, user_key: Optional[str]):
+        self.request_id = request_id
+        self.scope = scope
+        self.user_key = user_key
+        self.start = time.perf_counter()
+
+    @property
+    def route(self) -> str:
+        # FastAPI stores the matched route in the scope once routing is done
+        route = self.scope.get("route")
+        return route.path if route is not None else self.scope.get("path", "")
+
+    def latency_ms(self) -> float:
+        return round((time.perf_counter() - self.start) * 1000, 1)
+
+
+_request: ContextVar[Optional[RequestContext]] = ContextVar("log_request", default=None)
+
+
+def bind_request(context: RequestContext):
+    return _request.set(context)
+
+
+def unbind_request(token):
+    _request.reset(token)
+
+
+def current_request() -> Optional[RequestContext]:
+    return _request.get()
+
+
+def user_key(mobile_number: Optional[str]) -> Optional[str]:
+    """A stable pseudonym for a user, so logs can be grouped without the phone number."""
+    if not mobile_number:
+        return None
+    return hashlib.blake2b(mobile_number.encode(), digest_size=6).hexdigest()
+
+
+class ContextFilter(logging.Filter):
+    """Applies per-logger sampling and attaches the request context."""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            matches = [p for p in self.rates if name == p or name.startswith(p + ".")]
+            rate = self.rates[max(matches, key=len)] if matches else 1.0
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING and self.rates:
+            rate = self._rate(record.name)
+            if rate < 1.0 and random.random() >= rate:
+                return False
+        context = _request.get()
+        if context is not None:
+            record.request_id = context.request_id
+            record.route = context.route
+            record.latency_ms = context.latency_ms()
+            record.user_key = context.user_key
+        return True
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # Resolve the message and traceback here, where the arguments are
+        # still safe to read; the listener thread only serializes
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exception = "".join(traceback.format_exception(*record.exc_info))
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and value is not None:
+                entry[key] = value
+        if getattr(record, "exception", None):
+            entry["exception"] = record.exception
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+_handler: Optional[_NonBlockingQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging():
+    """Routes the root logger through the queue. Safe to call more than once."""
+    global _handler, _listener
+    if _listener is not None:
+        return
+    log_queue = queue.Queue(QUEUE_SIZE)
+    _handler = _NonBlockingQueueHandler(log_queue)
+    _handler.addFilter(ContextFilter(SAMPLE_RATES))
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter())
+    _listener = QueueListener(log_queue, output)
+    _listener.start()
+    atexit.register(stop_logging)
+
+    root = logging.getLogger()
+    root.handlers = [_handler]
+    root.setLevel(LOG_LEVEL)
+    # httpx logs every request URL at INFO, API keys in query strings included
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def stop_logging():
+    """Flushes what is queued and stops the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _log_metrics():
+    dropped = metrics.Counter("log_records_dropped_total", "Log records dropped because the queue was full")
+    dropped.inc(amount=_handler.dropped if _handler is not None else 0)
+    return [dropped]
+
+
+metrics.registry.register_collector(_log_metrics)
@@ -0,0 +1,135 @@
+import asyncio
+import gzip
+import os
+from collections import OrderedDict
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Negotiated response compression (brotli when the optional `brotli` package
+# is installed, else gzip). Only complete bodies of text-like types at least
+# COMPRESSION_MIN_BYTES long are compressed; streamed responses (SSE, NDJSON)
+# pass through untouched so events aren't held back. Bodies over
+# COMPRESSION_THREAD_MIN_BYTES are compressed in a worker thread so a large
+# product or equipment list doesn't stall the event loop.
+#
+# Responses that carry an ETag (every complete GET body, see conditional.py)
+# keep their compressed form in a small LRU keyed on (ETag, encoding), so an
+# unchanged equipment list isn't recompressed for every client. Routes that
+# serve their own pre-encoded bodies (/store/products) set Content-Encoding
+# and are passed through.
+MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+THREAD_MIN_BYTES = int(os.getenv("COMPRESSION_THREAD_MIN_BYTES", "65536"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+CACHE_MAX_BYTES = int(os.getenv("COMPRESSION_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/xml", "image/svg+xml")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """The best encoding we support from an Accept-Encoding header, if any."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in (("br", "gzip") if brotli else ("gzip",)):
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressedCache:
+    """LRU of compressed bodies by (ETag, encoding), bounded by total size."""
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[tuple, bytes]" = OrderedDict()
+
+    def get(self, key) -> Optional[bytes]:
+        body = self._entries.get(key)
+        if body is not None:
+            self._entries.move_to_end(key)
+        return body
+
+    def set(self, key, body: bytes):
+        if len(body) > self.max_bytes // 4 or key in self._entries:
+            return
+        self._entries[key] = body
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = MIN_BYTES, thread_min_size: int = THREAD_MIN_BYTES,
+                 cache_max_bytes: int = CACHE_MAX_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.thread_min_size = thread_min_size
+        self.cache = CompressedCache(cache_max_bytes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, passthrough
+            if passthrough:
+                return await send(message)
+            if message["type"] == "http.response.start":
+                # Hold the headers until we know what the body looks like
+                start = message
+                return
+
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start["headers"])
+            passthrough = True
+            if message.get("more_body", False) or "content-encoding" in headers \
+                    or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES):
+                await send(start)
+                return await send(message)
+
+            headers.add_vary_header("Accept-Encoding")
+            if encoding and len(body) >= self.minimum_size:
+                etag = headers.get("etag")
+                cached = self.cache.get((etag, encoding)) if etag else None
+                if cached is not None:
+                    body = cached
+                else:
+                    if len(body) >= self.thread_min_size:
+                        body = await asyncio.to_thread(compress, body, encoding)
+                    else:
+                        body = compress(body, encoding)
+                    if etag:
+                        self.cache.set((etag, encoding), body)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,70 @@
+import asyncio
+import hashlib
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+from app.middleware.compression import THREAD_MIN_BYTES
+
+# Weak ETags for every complete 200 GET response that doesn't set its own,
+# derived from the body, so a client revalidating with If-None-Match gets a
+# bodiless 304 when nothing changed. The route still runs; what's saved is
+# the transfer, which dominates on slow mobile links. Routes that can answer
+# 304 without building the body (e.g. /store/products) set their own ETag.
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    # Weak comparison, as If-None-Match requires
+    bare = etag[2:] if etag.startswith("W/") else etag
+    return "*" in tags or bare in [t[2:] if t.startswith("W/") else t for t in tags]
+
+
+def _body_etag(body: bytes) -> str:
+    return 'W/"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+class ConditionalGetMiddleware:
+    def __init__(self, app, thread_min_size: int = THREAD_MIN_BYTES):
+        self.app = app
+        self.thread_min_size = thread_min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            return await self.app(scope, receive, send)
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        start = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, passthrough
+            if passthrough:
+                return await send(message)
+            if message["type"] == "http.response.start":
+                start = message
+                return
+
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start["headers"])
+            passthrough = True
+            if start["status"] != 200 or message.get("more_body", False) or "etag" in headers:
+                await send(start)
+                return await send(message)
+
+            if len(body) >= self.thread_min_size:
+                etag = await asyncio.to_thread(_body_etag, body)
+            else:
+                etag = _body_etag(body)
+            headers["ETag"] = etag
+
+            if etag_matches(if_none_match, etag):
+                for name in ("content-length", "content-type"):
+                    if name in headers:
+                        del headers[name]
+                await send({**start, "status": 304})
+                return await send({"type": "http.response.body", "body": b""})
+            await send(start)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
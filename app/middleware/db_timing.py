@@ -0,0 +1,59 @@
+import logging
+import os
+import time
+from starlette.datastructures import MutableHeaders
+from app.services.db_monitor import track_db
+
+logger = logging.getLogger(__name__)
+
+# Tracks the Mongo commands each request issues (see db_monitor.track_db) and
+# reports them in a Server-Timing header, which browser dev tools show next
+# to the request:
+#
+#     Server-Timing: db;dur=12.4;desc="5 commands", app;dur=18.0
+#
+# Requests that exceed DB_LOG_ROUND_TRIPS commands or DB_LOG_MS of database
+# time are logged, as are requests that issue the same command on the same
+# collection DB_REPEAT_THRESHOLD or more times, the usual sign of a query
+# inside a loop. The header covers commands issued before the response
+# started; the log covers the whole request.
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1").lower() in ("1", "true", "yes")
+LOG_ROUND_TRIPS = int(os.getenv("DB_LOG_ROUND_TRIPS", "10"))
+LOG_MS = float(os.getenv("DB_LOG_MS", "200"))
+REPEAT_THRESHOLD = int(os.getenv("DB_REPEAT_THRESHOLD", "5"))
+
+
+class DbTimingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        with track_db() as stats:
+            async def send_wrapper(message):
+                if SERVER_TIMING and message["type"] == "http.response.start":
+                    elapsed = (time.perf_counter() - start) * 1000
+                    MutableHeaders(scope=message).append(
+                        "Server-Timing",
+                        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.round_trips} commands", app;dur={elapsed:.1f}'
+                    )
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                self._report(scope, stats)
+
+    def _report(self, scope, stats):
+        repeated = stats.repeated(REPEAT_THRESHOLD)
+        if stats.round_trips <= LOG_ROUND_TRIPS and stats.db_time * 1000 <= LOG_MS and not repeated:
+            return
+        route = scope.get("route")
+        path = route.path if route is not None else scope["path"]
+        message = f"{scope['method']} {path}: {stats.summary()}"
+        if repeated:
+            message += "; repeated: " + ", ".join(f"{cmd} {coll} x{n}" for coll, cmd, n in repeated)
+        logger.warning(message)
@@ -0,0 +1,68 @@
+import time
+from app.services.metrics import registry
+
+# Per-route request counts, latency and in-flight requests for GET /metrics.
+# Routes are labelled by their template (/community/posts/{post_id}), read
+# from the route FastAPI stores in the scope while matching, so labels stay
+# bounded; anything that matched no route is counted as "unmatched".
+# Latency covers the whole response, including streamed bodies. The series
+# for each method and route are looked up once and reused, so a request
+# costs a few increments rather than label hashing in every metric.
+
+REQUESTS = registry.counter("http_requests_total", "HTTP requests handled", ("method", "route", "status"))
+LATENCY = registry.histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+IN_FLIGHT = registry.gauge("http_requests_in_flight", "HTTP requests being handled", ("method",))
+
+
+class _RouteSeries:
+    __slots__ = ("method", "route", "latency", "by_status")
+
+    def __init__(self, method: str, route: str):
+        self.method = method
+        self.route = route
+        self.latency = LATENCY.labels(method, route)
+        self.by_status = {}
+
+    def record(self, status: int, elapsed: float):
+        requests = self.by_status.get(status)
+        if requests is None:
+            requests = self.by_status[status] = REQUESTS.labels(self.method, self.route, str(status))
+        requests.inc()
+        self.latency.observe(elapsed)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self._in_flight = {}
+        self._series = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_flight = self._in_flight.get(method)
+        if in_flight is None:
+            in_flight = self._in_flight[method] = IN_FLIGHT.labels(method)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_flight.dec()
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            series = self._series.get((method, path))
+            if series is None:
+                series = self._series[(method, path)] = _RouteSeries(method, path)
+            series.record(status, elapsed)
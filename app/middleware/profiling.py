@@ -0,0 +1,193 @@
+import asyncio
+import hmac
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+from pymongo import monitoring
+from starlette.datastructures import Headers, MutableHeaders
+
+# Opt-in wall-clock profiles of individual requests, for finding out where a
+# slow route spends its time (validation, BSON decoding, awaiting Mongo...).
+#
+# A request is profiled when it is picked by PROFILE_SAMPLE_RATE (0-1) or
+# sends `X-Profile: <PROFILE_TOKEN>`. While it runs, a sampler thread records
+# every PROFILE_INTERVAL_MS where the request is:
+#   - running on the event loop: the loop thread's Python stack
+#   - suspended: its coroutine chain, ending in "[await <what>]"
+#   - in a Mongo command: the Motor worker thread's stack, under "[mongo]"
+#     (that's where sockets are read and BSON decoded)
+# Stacks are written in folded format (`frame;frame;frame count`), which
+# flamegraph.pl and speedscope read, to PROFILE_DIR. Only the newest
+# PROFILE_MAX_FILES profiles are kept. The response's X-Profile-Id header
+# names the file.
+#
+# With neither a rate nor a token configured, main.py doesn't install the
+# middleware, so there is no per-request cost at all.
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+TOKEN = os.getenv("PROFILE_TOKEN", "")
+INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "100"))
+
+
+def profiling_enabled() -> bool:
+    return SAMPLE_RATE > 0 or bool(TOKEN)
+
+
+def _label(code) -> str:
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _thread_stack(frame) -> list:
+    stack = []
+    while frame is not None:
+        stack.append(_label(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _task_stack(task: asyncio.Task) -> list:
+    """The chain of coroutines a suspended task is awaiting through."""
+    stack = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            stack.append(f"[await {type(awaitable).__name__}]")
+            break
+        stack.append(_label(frame.f_code))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return stack
+
+
+class Session:
+    """Samples one request until stopped, then writes its profile."""
+
+    def __init__(self, loop, task: asyncio.Task, profile_id: str):
+        self.loop = loop
+        self.task = task
+        self.loop_thread = threading.get_ident()
+        self.profile_id = profile_id
+        self.samples = Counter()
+        # Worker threads currently running a Mongo command for this request
+        self.mongo_threads = Counter()
+        self.label = ""
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{profile_id}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, label: str):
+        self.label = label
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(INTERVAL_SECONDS):
+            self._sample()
+        self._write()
+
+    def _sample(self):
+        frames = sys._current_frames()
+        if asyncio.current_task(self.loop) is self.task:
+            stack = _thread_stack(frames.get(self.loop_thread))
+        else:
+            stack = _task_stack(self.task)
+        if stack:
+            self.samples[";".join(stack)] += 1
+        for thread_id in list(self.mongo_threads):
+            frame = frames.get(thread_id)
+            if frame is not None:
+                self.samples[";".join(["[mongo]"] + _thread_stack(frame))] += 1
+
+    def _write(self):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{self.profile_id}_{self.label}.folded")
+        with open(path, "w") as f:
+            for stack, count in self.samples.items():
+                f.write(f"{stack} {count}\n")
+        # Keep the ring bounded: drop the oldest profiles past MAX_FILES
+        profiles = sorted(name for name in os.listdir(PROFILE_DIR) if name.endswith(".folded"))
+        for name in profiles[:-MAX_FILES]:
+            try:
+                os.remove(os.path.join(PROFILE_DIR, name))
+            except OSError:
+                pass
+
+
+_session: ContextVar[Optional[Session]] = ContextVar("profile_session", default=None)
+
+
+class _MongoThreadTracker(monitoring.CommandListener):
+    """Tells a session which worker threads are running its Mongo commands."""
+
+    def started(self, event):
+        session = _session.get()
+        if session is not None:
+            session.mongo_threads[threading.get_ident()] += 1
+
+    def _finish(self, event):
+        session = _session.get()
+        if session is not None:
+            thread_id = threading.get_ident()
+            session.mongo_threads[thread_id] -= 1
+            if session.mongo_threads[thread_id] <= 0:
+                del session.mongo_threads[thread_id]
+
+    succeeded = _finish
+    failed = _finish
+
+
+def _file_label(method: str, path: str, elapsed_ms: float) -> str:
+    return f"{method}{re.sub(r'[^A-Za-z0-9]+', '-', path).rstrip('-')}_{elapsed_ms:.0f}ms"
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, sample_rate: float = SAMPLE_RATE, token: str = TOKEN):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.token = token
+        # The stack is built when the lifespan starts, before database.py
+        # creates the client, and globally registered listeners apply to it
+        monitoring.register(_MongoThreadTracker())
+
+    def _wanted(self, scope) -> bool:
+        if self.token:
+            supplied = Headers(scope=scope).get("x-profile")
+            if supplied and hmac.compare_digest(supplied.encode(), self.token.encode()):
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            return await self.app(scope, receive, send)
+
+        # Sortable by time, which is how the ring finds the oldest
+        profile_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f") + "-" + secrets.token_hex(4)
+        session = Session(asyncio.get_running_loop(), asyncio.current_task(), profile_id)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile-Id", profile_id)
+            await send(message)
+
+        token = _session.set(session)
+        start = time.perf_counter()
+        session.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _session.reset(token)
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            session.stop(_file_label(scope["method"], path, (time.perf_counter() - start) * 1000))
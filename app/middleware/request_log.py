@@ -0,0 +1,56 @@
+import logging
+import os
+import time
+import uuid
+from starlette.datastructures import Headers, MutableHeaders
+from app.log import RequestContext, bind_request, unbind_request, user_key
+from app.services.db_monitor import track_db
+
+# Binds the request context every log record picks up (see app/log.py),
+# echoes the request id in X-Request-ID, and writes one access record per
+# request to "app.access". Requests slower than LOG_SLOW_REQUEST_MS also get
+# a WARNING on "app.slow" listing the Mongo commands they issued.
+SLOW_REQUEST_MS = float(os.getenv("LOG_SLOW_REQUEST_MS", "1000"))
+
+access_log = logging.getLogger("app.access")
+slow_log = logging.getLogger("app.slow")
+
+
+class RequestLogMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = Headers(scope=scope)
+        # Keep an id assigned by a proxy so logs can be joined across hops
+        request_id = headers.get("x-request-id") or uuid.uuid4().hex
+        context = RequestContext(request_id, scope, user_key(headers.get("x-user-phone")))
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append("X-Request-ID", request_id)
+            await send(message)
+
+        token = bind_request(context)
+        try:
+            with track_db() as stats:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            fields = {"method": scope["method"], "status": status}
+            access_log.log(logging.WARNING if status >= 500 else logging.INFO, "request", extra=fields)
+            if (time.perf_counter() - context.start) * 1000 >= SLOW_REQUEST_MS:
+                slow_log.warning("slow request", extra={**fields, "mongo": {
+                    "round_trips": stats.round_trips,
+                    "db_ms": round(stats.db_time * 1000, 1),
+                    "commands": [
+                        {"collection": coll, "command": cmd, "ms": round(seconds * 1000, 1)}
+                        for coll, cmd, seconds in stats.commands
+                    ],
+                }})
+            unbind_request(token)
@@ -42,17 +42,37 @@ class CommunityPostResponse(CommunityPostBase):
     class Config:
         populate_by_name = True
 
+class TagFacet(BaseModel):
+    tag: str
+    count: int
+
+class CommunitySearchResponse(BaseModel):
+    results: List[CommunityPostResponse]
+    tag_facets: List[TagFacet]
+    next_cursor: Optional[str] = Field(None, description="Pass as `cursor` to fetch the next page")
+
+class TrendingTag(BaseModel):
+    tag: str
+    recent_posts: int = Field(..., description="Posts with this tag created within the window")
+    total_posts: int
+
 # --- Comment Models ---
 
 class CommentBase(BaseModel):
     content: str = Field(..., min_length=1)
 
 class CommentCreate(CommentBase):
-    pass
+    parent_id: Optional[str] = Field(None, description="Comment being replied to, if any")
 
 class CommentDB(CommentBase):
     id: PyObjectId = Field(default_factory=lambda: PyObjectId(ObjectId()), alias="_id")
     post_id: PyObjectId
+    parent_id: Optional[PyObjectId] = None
+    # Materialized path: ancestor ids and own id joined by "." so a thread
+    # sorts depth-first and a subtree is a prefix range on (post_id, path)
+    path: str
+    depth: int = 0
+    reply_count: int = 0
     author_id: PyObjectId
     author_name: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -66,6 +86,10 @@ class CommentDB(CommentBase):
 class CommentResponse(CommentBase):
     id: PyObjectId = Field(alias="_id")
     post_id: PyObjectId
+    parent_id: Optional[PyObjectId] = None
+    path: str = Field("", description="Pass the last comment's path as `after` to fetch the next page")
+    depth: int = 0
+    reply_count: int = 0
     author_id: PyObjectId
     author_name: str
     created_at: datetime
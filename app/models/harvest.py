@@ -0,0 +1,43 @@
+from pydantic import BaseModel, Field
+from datetime import date, datetime
+from typing import List, Optional
+from enum import Enum
+from app.models.shared import PyObjectId
+
+class DecisionSource(str, Enum):
+    RULES = "rules"
+    CACHE = "cache"
+    LLM = "llm"
+    FALLBACK = "fallback"
+
+class HarvestRequest(BaseModel):
+    crop_type: str
+    sowing_date: date
+    location: str = Field(..., description="City name or \"lat,long\"")
+
+class HarvestBatchItem(HarvestRequest):
+    field_id: Optional[str] = Field(None, description="Caller's reference, echoed back with the result")
+
+class HarvestBatchRequest(BaseModel):
+    fields: List[HarvestBatchItem] = Field(..., min_length=1, max_length=500)
+
+class HarvestResponse(BaseModel):
+    crop_type: str
+    days_after_sowing: int
+    maturity_percent: float
+    weather_summary: str
+    weather_risk_level: str
+    recommendation: str
+    reasoning: str
+    farmer_advice: str
+    decision_source: DecisionSource = Field(..., description="Which path produced the recommendation")
+
+class Advisory(HarvestResponse):
+    id: PyObjectId = Field(alias="_id")
+    user_id: PyObjectId
+    sowing_date: date
+    location: str
+    computed_at: datetime
+
+    class Config:
+        populate_by_name = True
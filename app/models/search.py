@@ -0,0 +1,12 @@
+from pydantic import BaseModel, Field
+from enum import Enum
+
+class SuggestionKind(str, Enum):
+    PRODUCT = "product"
+    EQUIPMENT = "equipment"
+
+class Suggestion(BaseModel):
+    kind: SuggestionKind
+    id: str
+    label: str = Field(..., description="Product name or equipment type")
+    detail: str = Field("", description="Seller, or the start of the equipment description")
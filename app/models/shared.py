@@ -14,9 +14,8 @@ class PyObjectId(ObjectId):
                 core_schema.is_instance_schema(ObjectId),
                 core_schema.str_schema(),
             ]),
-            serialization=core_schema.plain_serializer_function_ser_schema(
-                lambda x: str(x)
-            ),
+            # str() in pydantic-core, without a Python callback per id
+            serialization=core_schema.to_string_ser_schema(when_used="always"),
         )
 
     @classmethod
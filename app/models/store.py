@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, HttpUrl
-from typing import Optional, List
+from typing import Optional, List, Dict, Literal
 from app.models.shared import PyObjectId
 from datetime import datetime
 
@@ -19,9 +19,22 @@ class Product(BaseModel):
         populate_by_name = True
         json_encoders = {PyObjectId: str}
 
+class ProductPage(BaseModel):
+    items: List[Product]
+    next_cursor: Optional[str] = Field(None, description="Pass as `cursor` to fetch the next page")
+    category_counts: Dict[str, int] = Field(..., description="Matching products per category, ignoring the category filter")
+
 class CartItem(BaseModel):
     product_id: str
+    quantity: int = Field(default=1, gt=0)
+
+class CartChange(BaseModel):
+    product_id: str
+    op: Literal["add", "set", "remove"] = Field("add", description="add: change quantity by `quantity` (negative decrements), set: replace it, remove: drop the line")
     quantity: int = 1
+
+class CartBatch(BaseModel):
+    changes: List[CartChange] = Field(..., min_length=1, max_length=50)
     
 class Cart(BaseModel):
     user_id: str = Field(..., description="User's mobile number or ID")
@@ -32,6 +45,27 @@ class Cart(BaseModel):
         populate_by_name = True
         json_encoders = {PyObjectId: str}
 
+class OrderLine(BaseModel):
+    product_id: str
+    name: str
+    quantity: int
+    unit_price: float
+    line_total: float
+
+class Order(BaseModel):
+    id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
+    user_id: str
+    items: List[OrderLine]
+    total_price: float
+    total_items: int
+    status: str = "placed"
+    idempotency_key: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Config:
+        populate_by_name = True
+        json_encoders = {PyObjectId: str}
+
 class CartResponse(BaseModel):
     items: List[dict] # detailed items with product info
     total_price: float
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
+from datetime import date, datetime
 from app.models.shared import PyObjectId, Location
 from enum import Enum
 
@@ -15,6 +16,7 @@ class UserBase(BaseModel):
     acres_land: Optional[float] = None
     years_experience: Optional[int] = None
     crops_rotation: Optional[List[str]] = Field(default_factory=list)
+    crop_sowing_dates: Optional[Dict[str, datetime]] = Field(default_factory=dict, description="Crop -> sowing date, used for advisories")
 
 class UserRegister(BaseModel):
     mobile_number: str
@@ -23,9 +25,12 @@ class UserProfileUpdate(BaseModel):
     name: Optional[str] = None
     acres_land: Optional[float] = None
     years_experience: Optional[int] = None
+    location_lat: Optional[float] = None
+    location_long: Optional[float] = None
 
 class UserCropsUpdate(BaseModel):
     crops_rotation: List[str]
+    sowing_dates: Optional[Dict[str, date]] = None
 
 class UserDB(UserBase):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
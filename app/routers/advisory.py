@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Depends
+from typing import List
+from app.auth import get_current_user
+from app.models.user import UserDB
+from app.models.harvest import Advisory
+from app.services.advisories import ADVISORIES
+from database import get_db
+
+router = APIRouter(prefix="/api/advisories", tags=["Advisory"])
+
+@router.get("/me", response_model=List[Advisory])
+async def get_my_advisories(current_user: UserDB = Depends(get_current_user)):
+    """Harvest advisories precomputed overnight for each crop in the user's rotation."""
+    db = get_db()
+    docs = await db[ADVISORIES].find({"user_id": current_user.id}).to_list(length=None)
+    return [Advisory(**doc) for doc in docs]
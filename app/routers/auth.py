@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, Body
 from app.auth import get_current_user
 from app.models.user import UserRegister, UserResponse, UserDB, UserProfileUpdate, UserCropsUpdate, UserRole
 from database import get_db
+from datetime import datetime, time
 
 router = APIRouter()
 
@@ -34,6 +35,9 @@ async def update_profile(
     db = get_db()
     
     update_data = {k: v for k, v in profile_data.dict().items() if v is not None}
+    lat, long = update_data.pop("location_lat", None), update_data.pop("location_long", None)
+    if lat is not None and long is not None:
+        update_data["location"] = {"type": "Point", "coordinates": [long, lat]}
     
     if update_data:
         # Check if id needs to be objectId
@@ -51,9 +55,17 @@ async def update_crops(
     current_user: UserDB = Depends(get_current_user)
 ):
     db = get_db()
+    update = {"crops_rotation": crops_data.crops_rotation}
+    if crops_data.sowing_dates is not None:
+        # Mongo has no date type; store midnight datetimes
+        update["crop_sowing_dates"] = {
+            crop: datetime.combine(sown, time.min)
+            for crop, sown in crops_data.sowing_dates.items()
+            if crop in crops_data.crops_rotation
+        }
     await db["users"].update_one(
         {"_id": current_user.id},
-        {"$set": {"crops_rotation": crops_data.crops_rotation}}
+        {"$set": update}
     )
     
     updated_user = await db["users"].find_one({"_id": current_user.id})
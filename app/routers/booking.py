@@ -60,7 +60,8 @@ async def create_booking(booking: BookingCreate, current_user: UserDB = Depends(
 async def get_user_bookings(current_user: UserDB = Depends(get_current_user)):
     db = get_db()
     bookings = await db["bookings"].find({"renter_id": str(current_user.id)}).to_list(length=100)
-    return [BookingDB(**b) for b in bookings]
+    # response_model validates and encodes the documents in one pass
+    return bookings
 
 @router.patch("/status/{booking_id}", response_model=BookingResponse)
 async def update_booking_status(booking_id: str, status: BookingStatus, current_user: UserDB = Depends(get_current_user)):
@@ -164,7 +165,7 @@ async def list_booked_equipment():
         "status": {"$in": ["pending", "confirmed"]}
     }).to_list(length=100)
     
-    return [BookingDB(**b) for b in bookings]
+    return bookings
 
 @router.get("/incoming", response_model=List[BookingResponse])
 async def get_incoming_bookings(mobile_number: str):
@@ -196,4 +197,4 @@ async def get_incoming_bookings(mobile_number: str):
         "equipment_id": {"$in": equipment_ids}
     }).sort("created_at", -1).to_list(length=100)
     
-    return [BookingDB(**b) for b in bookings]
+    return bookings
@@ -1,17 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Body
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Body, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 from app.auth import get_current_user
 from app.models.user import UserDB
 from app.models.community import (
     CommunityPostCreate, CommunityPostDB, CommunityPostResponse,
-    CommentCreate, CommentDB, CommentResponse, VoteType
+    CommentCreate, CommentDB, CommentResponse, VoteType, CommunitySearchResponse,
+    TrendingTag
 )
+from app.services.community_search import build_search_pipeline, split_page
+from app.services.tag_stats import RETENTION_DAYS, clean_tags, record_post_tags, get_trending_tags
+from app.services.post_cleanup import enqueue_post_deletion
+from app.services.feed_stream import feed
 from database import get_db
 from bson import ObjectId
 from datetime import datetime
+import logging
+import re
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/community", tags=["Community"])
 
+# Each level adds 25 characters to a comment's path
+MAX_COMMENT_DEPTH = 10
+
+# Comment line sent on idle streams so proxies keep the connection open
+STREAM_HEARTBEAT_SECONDS = 15
+
 # --- Posts ---
 
 @router.get("/posts", response_model=List[CommunityPostResponse])
@@ -27,7 +43,8 @@ async def get_posts(
     if sort_by == "popular":
         sort_criteria = [("upvotes", -1), ("created_at", -1)]
         
-    cursor = db["community_posts"].find({"_id": {"$ne": ""}}).sort(sort_criteria).skip(skip).limit(limit)
+    # deleted_at is set while a deleted post's cascade is still pending
+    cursor = db["community_posts"].find({"_id": {"$ne": ""}, "deleted_at": None}).sort(sort_criteria).skip(skip).limit(limit)
     posts = await cursor.to_list(length=limit)
     
     # Calculate user_vote for each post
@@ -51,6 +68,87 @@ async def get_posts(
         
     return result
 
+@router.get("/stream")
+async def stream_feed(
+    request: Request,
+    current_user: UserDB = Depends(get_current_user)
+):
+    """
+    Server-Sent Events feed of post changes: post_created, post_updated,
+    post_stats (vote/comment counts) and post_deleted. An "overflow" event
+    means this client fell behind and should refetch /posts.
+    """
+    sub = feed.subscribe()
+    if sub is None:
+        raise HTTPException(status_code=503, detail="Too many live subscribers, please poll instead")
+
+    async def event_source():
+        try:
+            yield b"retry: 5000\n\n"
+            while not sub.closed:
+                events = await sub.next_batch(timeout=STREAM_HEARTBEAT_SECONDS)
+                if await request.is_disconnected():
+                    break
+                if events:
+                    yield b"".join(e.encode() for e in events)
+                elif not sub.closed:
+                    yield b": keep-alive\n\n"
+            if sub.overflowed:
+                yield b"event: overflow\ndata: {}\n\n"
+        finally:
+            feed.unsubscribe(sub)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/search", response_model=CommunitySearchResponse)
+async def search_posts(
+    q: str = Query(..., min_length=1, max_length=200),
+    tag: Optional[List[str]] = Query(None, description="Only posts carrying all of these tags"),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=50),
+    current_user: UserDB = Depends(get_current_user)
+):
+    db = get_db()
+
+    try:
+        pipeline = build_search_pipeline(q, tags=tag, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    facets = await db["community_posts"].aggregate(pipeline).to_list(length=1)
+    facets = facets[0] if facets else {"results": [], "tag_facets": []}
+    posts, next_cursor = split_page(facets["results"], limit)
+
+    post_ids = [p["_id"] for p in posts]
+    user_votes = await db["post_votes"].find({
+        "user_id": current_user.id,
+        "post_id": {"$in": post_ids}
+    }).to_list(length=len(posts))
+
+    vote_map = {v["post_id"]: v["vote_type"] for v in user_votes}
+
+    for p in posts:
+        p["user_vote"] = vote_map.get(p["_id"], 0)
+        p["is_owner"] = str(p["author_id"]) == str(current_user.id)
+
+    return {
+        "results": posts,
+        "tag_facets": [{"tag": f["_id"], "count": f["count"]} for f in facets["tag_facets"]],
+        "next_cursor": next_cursor
+    }
+
+@router.get("/tags/trending", response_model=List[TrendingTag])
+async def trending_tags(
+    window_days: int = Query(7, ge=1, le=RETENTION_DAYS),
+    limit: int = Query(10, ge=1, le=50),
+    current_user: UserDB = Depends(get_current_user)
+):
+    return await get_trending_tags(get_db(), window_days=window_days, limit=limit)
+
 @router.get("/my-posts", response_model=List[CommunityPostResponse])
 async def get_my_posts(
     skip: int = 0,
@@ -60,9 +158,12 @@ async def get_my_posts(
     db = get_db()
     
     # Query by mobile number if available, otherwise fallback to author_id
-    query = {"author_id": current_user.id}
+    query = {"author_id": current_user.id, "deleted_at": None}
     if current_user.mobile_number:
-         query = {"$or": [{"author_id": current_user.id}, {"author_mobile": current_user.mobile_number}]}
+         query = {
+             "$or": [{"author_id": current_user.id}, {"author_mobile": current_user.mobile_number}],
+             "deleted_at": None
+         }
          
     cursor = db["community_posts"].find(query).sort("created_at", -1).skip(skip).limit(limit)
     posts = await cursor.to_list(length=limit)
@@ -100,8 +201,11 @@ async def create_post(
     post_dict = new_post.dict(by_alias=True)
     if "_id" in post_dict and isinstance(post_dict["_id"], str):
         post_dict["_id"] = ObjectId(post_dict["_id"])
+    # Stored normalized so the search tag filter and trending tags agree
+    post_dict["tags"] = clean_tags(post_dict["tags"])
         
     result = await db["community_posts"].insert_one(post_dict)
+    await record_post_tags(db, [], post_dict["tags"], post_dict["created_at"])
     created_post = await db["community_posts"].find_one({"_id": result.inserted_id})
     created_post["is_owner"] = True
     return created_post
@@ -115,7 +219,7 @@ async def get_post(
     if not ObjectId.is_valid(post_id):
         raise HTTPException(status_code=400, detail="Invalid post ID")
         
-    post = await db["community_posts"].find_one({"_id": ObjectId(post_id)})
+    post = await db["community_posts"].find_one({"_id": ObjectId(post_id), "deleted_at": None})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
         
@@ -140,7 +244,7 @@ async def update_post(
     if not ObjectId.is_valid(post_id):
         raise HTTPException(status_code=400, detail="Invalid post ID")
         
-    post = await db["community_posts"].find_one({"_id": ObjectId(post_id)})
+    post = await db["community_posts"].find_one({"_id": ObjectId(post_id), "deleted_at": None})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
         
@@ -150,13 +254,14 @@ async def update_post(
     update_data = {
         "title": post_update.title,
         "content": post_update.content,
-        "tags": post_update.tags
+        "tags": clean_tags(post_update.tags)
     }
     
     await db["community_posts"].update_one(
         {"_id": ObjectId(post_id)},
         {"$set": update_data}
     )
+    await record_post_tags(db, post.get("tags", []), update_data["tags"], post["created_at"])
     
     updated_post = await db["community_posts"].find_one({"_id": ObjectId(post_id)})
     
@@ -180,39 +285,118 @@ async def delete_post(
     if not ObjectId.is_valid(post_id):
         raise HTTPException(status_code=400, detail="Invalid post ID")
         
-    post = await db["community_posts"].find_one({"_id": ObjectId(post_id)})
+    post = await db["community_posts"].find_one({"_id": ObjectId(post_id), "deleted_at": None})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
         
     if str(post["author_id"]) != str(current_user.id):
         raise HTTPException(status_code=403, detail="Not authorized to delete this post")
         
-    # Delete post
-    await db["community_posts"].delete_one({"_id": ObjectId(post_id)})
-    
-    # Delete associated comments
-    await db["community_comments"].delete_many({"post_id": ObjectId(post_id)})
-    
-    # Delete associated votes (optional, but cleaner)
-    await db["post_votes"].delete_many({"post_id": ObjectId(post_id)})
+    # Tombstone now so the post disappears from feeds; comments and votes
+    # are removed in batches by the background deletion worker
+    await db["community_posts"].update_one(
+        {"_id": ObjectId(post_id)},
+        {"$set": {"deleted_at": datetime.utcnow()}}
+    )
+    await record_post_tags(db, post.get("tags", []), [], post["created_at"])
+    await enqueue_post_deletion(db, ObjectId(post_id))
     
     return {"message": "Post deleted successfully"}
 
 # --- Comments ---
 
+# Comments read per query when trimming a thread to N replies per level
+_THREAD_BATCH = 200
+
+async def _trimmed_thread(db, query: dict, path_filter: dict, base_depth: int,
+                          after: Optional[str], limit: int, per_level: int) -> list:
+    """
+    Up to `limit` comments at base_depth, each followed by its first
+    `per_level` replies per level, in path order. Whenever a comment already
+    has `per_level` replies, the scan jumps past the rest of its subtree
+    (paths starting "<path>." sort below "<path>/"), so skipped replies are
+    never read. Pages end on top-level boundaries, so `after` resumes past
+    the whole subtree of the top-level comment it belongs to.
+    """
+    start = None
+    if after:
+        start = ".".join(after.split(".")[:base_depth + 1]) + "/"
+
+    results, kept, top_level = [], {}, 0
+    while True:
+        path = {**path_filter, "$gt": start} if start else path_filter
+        batch_query = {**query, "path": path} if path else query
+        batch = await db["community_comments"].find(batch_query).sort("path", 1).limit(_THREAD_BATCH).to_list(length=_THREAD_BATCH)
+        if not batch:
+            return results
+        for c in batch:
+            if c.get("depth", 0) <= base_depth:
+                if top_level == limit:
+                    return results
+                top_level += 1
+            else:
+                parent_path = c["path"].rsplit(".", 1)[0]
+                if kept.get(parent_path, 0) >= per_level:
+                    start = parent_path + "/"
+                    break
+                kept[parent_path] = kept.get(parent_path, 0) + 1
+            results.append(c)
+        else:
+            if len(batch) < _THREAD_BATCH:
+                return results
+            start = batch[-1]["path"]
+
 @router.get("/posts/{post_id}/comments", response_model=List[CommentResponse])
 async def get_comments(
     post_id: str,
-    skip: int = 0,
-    limit: int = 50,
+    parent_id: Optional[str] = Query(None, description="Only return replies beneath this comment"),
+    max_depth: Optional[int] = Query(None, ge=0, description="Levels to include below the top level / parent"),
+    replies_per_level: Optional[int] = Query(
+        None, ge=1, le=50,
+        description="Only the first N replies to each comment; `limit` then counts top-level comments"
+    ),
+    after: Optional[str] = Query(None, description="Path of the last comment from the previous page"),
+    limit: int = Query(50, ge=1, le=200),
     current_user: UserDB = Depends(get_current_user)
 ):
     db = get_db()
     if not ObjectId.is_valid(post_id):
          raise HTTPException(status_code=400, detail="Invalid post ID")
 
-    cursor = db["community_comments"].find({"post_id": ObjectId(post_id)}).sort("created_at", 1).skip(skip).limit(limit)
-    comments = await cursor.to_list(length=limit)
+    post = await db["community_posts"].find_one({"_id": ObjectId(post_id), "deleted_at": None}, {"_id": 1})
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+
+    query = {"post_id": ObjectId(post_id)}
+    path_filter = {}
+    base_depth = 0
+
+    if parent_id:
+        if not ObjectId.is_valid(parent_id):
+            raise HTTPException(status_code=400, detail="Invalid parent comment ID")
+        parent = await db["community_comments"].find_one(
+            {"_id": ObjectId(parent_id), "post_id": ObjectId(post_id)},
+            {"path": 1, "depth": 1}
+        )
+        if not parent:
+            raise HTTPException(status_code=404, detail="Parent comment not found")
+        # Anchored prefix regex is turned into an index range on path
+        path_filter["$regex"] = "^" + re.escape(parent.get("path") or str(parent["_id"])) + r"\."
+        base_depth = parent.get("depth", 0) + 1
+
+    if max_depth is not None:
+        query["depth"] = {"$lte": base_depth + max_depth}
+
+    if replies_per_level:
+        comments = await _trimmed_thread(db, query, path_filter, base_depth, after, limit, replies_per_level)
+    else:
+        if after:
+            path_filter["$gt"] = after
+        if path_filter:
+            query["path"] = path_filter
+        # Sorting by path yields depth-first thread order, siblings oldest first
+        cursor = db["community_comments"].find(query).sort("path", 1).limit(limit)
+        comments = await cursor.to_list(length=limit)
     
     comment_ids = [c["_id"] for c in comments]
     user_votes = await db["comment_votes"].find({
@@ -240,24 +424,61 @@ async def create_comment(
          raise HTTPException(status_code=400, detail="Invalid post ID")
          
     # Check if post exists
-    post = await db["community_posts"].find_one({"_id": ObjectId(post_id)})
+    post = await db["community_posts"].find_one({"_id": ObjectId(post_id), "deleted_at": None})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
+    parent = None
+    if comment.parent_id:
+        if not ObjectId.is_valid(comment.parent_id):
+            raise HTTPException(status_code=400, detail="Invalid parent comment ID")
+        parent = await db["community_comments"].find_one(
+            {"_id": ObjectId(comment.parent_id), "post_id": ObjectId(post_id)},
+            {"path": 1, "depth": 1}
+        )
+        if not parent:
+            raise HTTPException(status_code=404, detail="Parent comment not found")
+        if parent.get("depth", 0) + 1 > MAX_COMMENT_DEPTH:
+            raise HTTPException(status_code=400, detail="Reply nesting too deep")
+
+    comment_id = ObjectId()
+    if parent:
+        parent_path = parent.get("path") or str(parent["_id"])
+        path, depth = f"{parent_path}.{comment_id}", parent.get("depth", 0) + 1
+    else:
+        path, depth = str(comment_id), 0
+
     new_comment = CommentDB(
-        **comment.dict(),
+        **comment.dict(exclude={"parent_id"}),
+        _id=comment_id,
         post_id=ObjectId(post_id),
+        parent_id=parent["_id"] if parent else None,
+        path=path,
+        depth=depth,
         author_id=current_user.id,
         author_name=current_user.name or "Anonymous Farmer"
     )
     
-    result = await db["community_comments"].insert_one(new_comment.dict(by_alias=True))
+    # .dict() serializes PyObjectId fields to str; keep the queried ids as ObjectId
+    comment_dict = new_comment.dict(by_alias=True)
+    comment_dict["_id"] = comment_id
+    comment_dict["post_id"] = ObjectId(post_id)
+    comment_dict["parent_id"] = parent["_id"] if parent else None
+    
+    result = await db["community_comments"].insert_one(comment_dict)
     
     # Increment comment count on post
     await db["community_posts"].update_one(
         {"_id": ObjectId(post_id)},
         {"$inc": {"comment_count": 1}}
     )
+
+    # Keep the direct reply count on the parent in step
+    if parent:
+        await db["community_comments"].update_one(
+            {"_id": parent["_id"]},
+            {"$inc": {"reply_count": 1}}
+        )
     
     created_comment = await db["community_comments"].find_one({"_id": result.inserted_id})
     return created_comment
@@ -271,13 +492,18 @@ async def vote_post(
     current_user: UserDB = Depends(get_current_user)
 ):
     db = get_db()
-    print(f"Vote request for post_id: '{post_id}'")
+    logger.debug(f"Vote request for post_id: '{post_id}'")
     if not ObjectId.is_valid(post_id):
-         print(f"Invalid post ID: {post_id}")
+         logger.debug(f"Invalid post ID: {post_id}")
          raise HTTPException(status_code=400, detail="Invalid post ID")
 
     pid = ObjectId(post_id)
     uid = current_user.id
+
+    # Votes on a deleted post would outlive its cascade
+    post = await db["community_posts"].find_one({"_id": pid, "deleted_at": None}, {"_id": 1})
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
     
     # Check existing vote
     existing_vote = await db["post_votes"].find_one({"user_id": uid, "post_id": pid})
@@ -350,6 +576,14 @@ async def vote_comment(
 
     cid = ObjectId(comment_id)
     uid = current_user.id
+
+    comment = await db["community_comments"].find_one({"_id": cid}, {"post_id": 1})
+    if not comment:
+        raise HTTPException(status_code=404, detail="Comment not found")
+    # Votes on a deleted post's comments would outlive its cascade
+    post = await db["community_posts"].find_one({"_id": comment["post_id"], "deleted_at": None}, {"_id": 1})
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
     
     # Check existing vote
     existing_vote = await db["comment_votes"].find_one({"user_id": uid, "comment_id": cid})
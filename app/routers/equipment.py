@@ -3,6 +3,7 @@ from typing import List, Optional
 from app.auth import get_current_user
 from app.models.user import UserDB, UserRole
 from app.models.equipment import EquipmentCreate, EquipmentResponse, EquipmentDB, Location, EquipmentCreateByMobile
+from app.services.suggest import suggestions
 from database import get_db
 from bson import ObjectId
 
@@ -26,6 +27,7 @@ async def register_equipment(equipment: EquipmentCreate, current_user: UserDB =
 
     new_equipment = await db["equipment"].insert_one(equipment_dict)
     created_equipment = await db["equipment"].find_one({"_id": new_equipment.inserted_id})
+    suggestions.add_equipment(created_equipment)
     return EquipmentDB(**created_equipment)
 
 @router.post("/register-by-mobile", response_model=EquipmentResponse)
@@ -66,6 +68,7 @@ async def register_equipment_by_mobile(equipment: EquipmentCreateByMobile):
 
     new_equipment = await db["equipment"].insert_one(equipment_dict)
     created_equipment = await db["equipment"].find_one({"_id": new_equipment.inserted_id})
+    suggestions.add_equipment(created_equipment)
     return EquipmentDB(**created_equipment)
 
 @router.get("/nearby", response_model=List[EquipmentResponse])
@@ -95,7 +98,8 @@ async def get_nearby_equipment(
     
     cursor = db["equipment"].find(query)
     equipments = await cursor.to_list(length=100)
-    return [EquipmentDB(**eq) for eq in equipments]
+    # response_model validates and encodes the documents in one pass
+    return equipments
 
 @router.get("/my-listings", response_model=List[EquipmentResponse])
 async def get_my_listings(mobile_number: str):
@@ -106,7 +110,7 @@ async def get_my_listings(mobile_number: str):
     
     cursor = db["equipment"].find({"owner_id": str(user["_id"])})
     equipments = await cursor.to_list(length=100)
-    return [EquipmentDB(**eq) for eq in equipments]
+    return equipments
 
 @router.get("/{id}", response_model=EquipmentResponse)
 async def get_equipment(id: str):
@@ -119,7 +123,7 @@ async def get_equipment(id: str):
     equipment = await db["equipment"].find_one({"_id": oid})
     if not equipment:
         raise HTTPException(status_code=404, detail="Equipment not found")
-    return EquipmentDB(**equipment)
+    return equipment
 
 @router.delete("/{id}", response_model=bool)
 async def delete_equipment(id: str, mobile_number: str = Query(...)):
@@ -139,4 +143,5 @@ async def delete_equipment(id: str, mobile_number: str = Query(...)):
         raise HTTPException(status_code=403, detail="Not authorized to delete this equipment")
 
     result = await db["equipment"].delete_one({"_id": ObjectId(id)})
+    suggestions.remove_equipment(id)
     return result.deleted_count > 0
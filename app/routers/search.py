@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Query
+from typing import List, Optional
+from app.models.search import Suggestion, SuggestionKind
+from app.services.catalog import catalog
+from app.services.suggest import suggestions
+
+router = APIRouter(prefix="/search", tags=["Search"])
+
+@router.get("/suggest", response_model=List[Suggestion])
+async def suggest(
+    q: str = Query(..., min_length=1, max_length=100),
+    kind: Optional[SuggestionKind] = None,
+    limit: int = Query(10, ge=1, le=25)
+):
+    # No database access unless the catalog snapshot is due for a refresh
+    suggestions.sync_products(await catalog.get())
+    return suggestions.index.suggest(q, limit=limit, kind=kind.value if kind else None)
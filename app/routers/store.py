@@ -1,27 +1,122 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Header, Response, Query
 from app.auth import get_current_user
 from app.models.user import UserDB
-from app.models.store import Product, Cart, CartItem, CartResponse
-from database import get_db
+from app.models.store import Product, Cart, CartItem, CartResponse, ProductPage, CartBatch, Order
+from app.middleware.conditional import etag_matches
+from app.middleware.compression import choose_encoding
+from app.services.catalog import catalog, price_entry
+from app.services.product_query import SORT_OPTIONS, build_browse_pipelines, split_page
+from database import get_db, get_client
 from typing import List, Optional
 from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime
+import asyncio
+import base64
 
 router = APIRouter(prefix="/store", tags=["Store"])
 
 @router.get("/products", response_model=List[Product])
-async def get_products(category: Optional[str] = None):
+async def get_products(
+    category: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None)
+):
+    snapshot = await catalog.get()
+    # Compressed variants are cached on the snapshot, so only the first
+    # request per snapshot pays for compression
+    encoding = choose_encoding(accept_encoding or "")
+    if snapshot.needs_compressing(category, encoding):
+        body, etag = await asyncio.to_thread(snapshot.body_for, category, encoding)
+    else:
+        body, etag = snapshot.body_for(category, encoding)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "no-cache",
+        "X-Catalog-Version": str(snapshot.version),
+        "Vary": "Accept-Encoding"
+    }
+
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    if snapshot.encoding_applies(category, encoding):
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/products/browse", response_model=ProductPage)
+async def browse_products(
+    category: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    in_stock: bool = False,
+    min_rating: Optional[float] = Query(None, ge=0, le=5),
+    sort: str = Query("price_asc", enum=list(SORT_OPTIONS)),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=50)
+):
     db = get_db()
-    query = {}
-    if category:
-        query["category"] = category
-    
-    products = await db["products"].find(query).to_list(length=100)
-    return [Product(**p) for p in products]
+    try:
+        items_pipeline, categories_pipeline = build_browse_pipelines(
+            category=category, min_price=min_price, max_price=max_price,
+            in_stock=in_stock, min_rating=min_rating, sort=sort,
+            cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    items, categories = await asyncio.gather(
+        db["products"].aggregate(items_pipeline).to_list(length=limit + 1),
+        db["products"].aggregate(categories_pipeline).to_list(length=None)
+    )
+    items, next_cursor = split_page(items, limit, sort)
+
+    return ProductPage(
+        items=[Product(**p) for p in items],
+        next_cursor=next_cursor,
+        category_counts={c["_id"]: c["count"] for c in categories}
+    )
+
+@router.get("/products/{product_id}", response_model=Product)
+async def get_product(product_id: str):
+    snapshot = await catalog.get()
+    product = snapshot.by_id.get(product_id)
+    if product:
+        return product
+
+    if not ObjectId.is_valid(product_id):
+        raise HTTPException(status_code=400, detail="Invalid product ID")
+    doc = await get_db()["products"].find_one({"_id": ObjectId(product_id)})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Product not found")
+    catalog.mark_stale()
+    return Product(**doc)
+
+@router.get("/products/{product_id}/image")
+async def get_product_image(product_id: str):
+    """Serves the decoded product image so list views can reference it by URL."""
+    snapshot = await catalog.get()
+    product = snapshot.by_id.get(product_id)
+    if not product or not product.image:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    header, _, data = product.image.partition(",")
+    if not data:
+        header, data = "", product.image
+    media_type = header[5:].split(";")[0] if header.startswith("data:") else "image/jpeg"
+    try:
+        content = base64.b64decode(data)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return Response(content=content, media_type=media_type, headers={"Cache-Control": "public, max-age=86400"})
 
 @router.get("/cart", response_model=CartResponse)
-async def get_cart(current_user: UserDB = Depends(get_current_user)):
+async def get_cart(
+    details: bool = Query(False, description="Include the full product (with image) for each line"),
+    current_user: UserDB = Depends(get_current_user)
+):
     db = get_db()
-    cart = await db["carts"].find_one({"user_id": current_user.mobile_number})
+    cart = await db["carts"].find_one({"user_id": current_user.mobile_number}, {"items": 1})
     
     if not cart:
         return CartResponse(items=[], total_price=0.0, total_items=0)
@@ -30,71 +125,107 @@ async def get_cart(current_user: UserDB = Depends(get_current_user)):
     detailed_items = []
     total_price = 0.0
     total_items = 0
-    
-    product_ids = [ObjectId(item["product_id"]) for item in cart_items]
-    products = await db["products"].find({"_id": {"$in": product_ids}}).to_list(length=len(product_ids))
-    product_map = {str(p["_id"]): p for p in products}
+
+    # Lines are priced from the catalog's in-memory price index
+    snapshot = await catalog.get()
+    prices = snapshot.prices
+    products = snapshot.by_id
+
+    missing = [item["product_id"] for item in cart_items
+               if item["product_id"] not in prices and ObjectId.is_valid(item["product_id"])]
+    if missing:
+        # Products added since the last catalog refresh
+        projection = None if details else {"image": 0}
+        docs = await db["products"].find(
+            {"_id": {"$in": [ObjectId(pid) for pid in missing]}}, projection
+        ).to_list(length=len(missing))
+        prices = {**prices, **{str(d["_id"]): price_entry(d) for d in docs}}
+        if details:
+            products = {**products, **{str(d["_id"]): Product(**d) for d in docs}}
+        if docs:
+            catalog.mark_stale()
     
     for item in cart_items:
         pid = item["product_id"]
         qty = item["quantity"]
-        if pid in product_map:
-            product = product_map[pid]
-            # Ensure product has 'our_price', defaulting to 0 if missing for safety
-            price = product.get("our_price", 0.0)
-            item_total = price * qty
+        entry = prices.get(pid)
+        if entry:
+            item_total = entry.price * qty
             total_price += item_total
             total_items += qty
             
-            detailed_items.append({
-                "product": Product(**product),
+            line = {
+                "product_id": pid,
+                "name": entry.name,
+                "price": entry.price,
+                "stock": entry.stock,
+                "thumbnail": entry.thumbnail,
                 "quantity": qty,
                 "item_total": item_total
-            })
+            }
+            if details:
+                line["product"] = products[pid]
+            detailed_items.append(line)
             
     return CartResponse(items=detailed_items, total_price=total_price, total_items=total_items)
 
+# Cart lines are mutated with single atomic updates instead of read-modify-write.
+# Adding a product is an ordered bulk of three updates sent in one round trip:
+# create the cart if missing, $inc the matching line via arrayFilters, and
+# $push the line if it is not in the cart yet. Exactly one of the last two
+# modifies the cart.
+
+def _ensure_cart_op(user_id: str):
+    return UpdateOne({"user_id": user_id}, {"$setOnInsert": {"items": []}}, upsert=True)
+
+def _upsert_line_ops(user_id: str, product_id: str, quantity: int, replace: bool = False):
+    update = "$set" if replace else "$inc"
+    return [
+        UpdateOne(
+            {"user_id": user_id},
+            {update: {"items.$[line].quantity": quantity}},
+            array_filters=[{"line.product_id": product_id}]
+        ),
+        UpdateOne(
+            {"user_id": user_id, "items.product_id": {"$ne": product_id}},
+            {"$push": {"items": {"product_id": product_id, "quantity": quantity}}}
+        ),
+    ]
+
+def _remove_line_op(user_id: str, product_id: str):
+    return UpdateOne({"user_id": user_id}, {"$pull": {"items": {"product_id": product_id}}})
+
+async def _check_products_exist(db, product_ids: List[str]):
+    snapshot = await catalog.get()
+    unknown = [pid for pid in product_ids if pid not in snapshot.by_id]
+    if not unknown:
+        return
+    if not all(ObjectId.is_valid(pid) for pid in unknown):
+        raise HTTPException(status_code=400, detail="Invalid product ID")
+    # Products added since the last catalog refresh
+    found = await db["products"].find(
+        {"_id": {"$in": [ObjectId(pid) for pid in unknown]}}, {"_id": 1}
+    ).to_list(length=len(unknown))
+    if len(found) < len(set(unknown)):
+        raise HTTPException(status_code=404, detail="Product not found")
+    catalog.mark_stale()
+
 @router.post("/cart/add")
 async def add_to_cart(
     item: CartItem,
     current_user: UserDB = Depends(get_current_user)
 ):
     db = get_db()
-    
-    # Verify product exists
-    try:
-        product = await db["products"].find_one({"_id": ObjectId(item.product_id)})
-        if not product:
-            raise HTTPException(status_code=404, detail="Product not found")
-    except Exception:
-         raise HTTPException(status_code=400, detail="Invalid product ID")
+    await _check_products_exist(db, [item.product_id])
 
-    cart = await db["carts"].find_one({"user_id": current_user.mobile_number})
-    
-    if not cart:
-        # Create new cart
-        new_cart = {
-            "user_id": current_user.mobile_number,
-            "items": [{"product_id": item.product_id, "quantity": item.quantity}]
-        }
-        await db["carts"].insert_one(new_cart)
-    else:
-        # Update existing cart
-        items = cart.get("items", [])
-        found = False
-        for i in items:
-            if i["product_id"] == item.product_id:
-                i["quantity"] += item.quantity
-                found = True
-                break
-        
-        if not found:
-            items.append({"product_id": item.product_id, "quantity": item.quantity})
-            
-        await db["carts"].update_one(
-            {"user_id": current_user.mobile_number},
-            {"$set": {"items": items}}
-        )
+    user_id = current_user.mobile_number
+    ops = [_ensure_cart_op(user_id), *_upsert_line_ops(user_id, item.product_id, item.quantity)]
+    for _ in range(3):
+        result = await db["carts"].bulk_write(ops, ordered=True)
+        # Either the $inc or the $push applies, unless another device added
+        # the same product in between them; then simply go again
+        if result.modified_count:
+            break
         
     return {"message": "Item added to cart"}
 
@@ -106,23 +237,151 @@ async def remove_from_cart(
     current_user: UserDB = Depends(get_current_user)
 ):
     db = get_db()
-    cart = await db["carts"].find_one({"user_id": current_user.mobile_number})
-    if not cart:
-        raise HTTPException(status_code=404, detail="Cart not found")
-        
-    items = cart.get("items", [])
     # Remove item completely
-    new_items = [i for i in items if i["product_id"] != item.product_id]
-    
-    await db["carts"].update_one(
+    result = await db["carts"].update_one(
         {"user_id": current_user.mobile_number},
-        {"$set": {"items": new_items}}
+        {"$pull": {"items": {"product_id": item.product_id}}}
     )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Cart not found")
     return {"message": "Item removed from cart"}
 
-@router.post("/checkout")
-async def checkout(current_user: UserDB = Depends(get_current_user)):
+@router.post("/cart/batch")
+async def batch_update_cart(
+    batch: CartBatch,
+    current_user: UserDB = Depends(get_current_user)
+):
+    """Applies many cart changes, in order, in a single round trip."""
     db = get_db()
-    # Clear cart
-    await db["carts"].delete_one({"user_id": current_user.mobile_number})
-    return {"message": "Order placed successfully (Mock)"}
+    await _check_products_exist(db, [c.product_id for c in batch.changes if c.op != "remove"])
+
+    user_id = current_user.mobile_number
+    ops = [_ensure_cart_op(user_id)]
+    for change in batch.changes:
+        if change.op == "remove" or (change.op == "set" and change.quantity <= 0):
+            ops.append(_remove_line_op(user_id, change.product_id))
+        elif change.op == "set":
+            ops.extend(_upsert_line_ops(user_id, change.product_id, change.quantity, replace=True))
+        elif change.quantity > 0:
+            ops.extend(_upsert_line_ops(user_id, change.product_id, change.quantity))
+        elif change.quantity < 0:
+            # Decrement only; a line is never created with a negative quantity
+            ops.append(_upsert_line_ops(user_id, change.product_id, change.quantity)[0])
+    # Lines decremented to zero or below are dropped
+    ops.append(UpdateOne({"user_id": user_id}, {"$pull": {"items": {"quantity": {"$lte": 0}}}}))
+
+    await db["carts"].bulk_write(ops, ordered=True)
+    return {"message": "Cart updated", "applied": len(batch.changes)}
+
+class _InsufficientStock(Exception):
+    pass
+
+@router.post("/checkout", response_model=Order)
+async def checkout(
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=100),
+    current_user: UserDB = Depends(get_current_user)
+):
+    """
+    Places an order for the whole cart in one transaction: reserves stock for
+    every line with a single conditional bulk_write, records the order and
+    clears the cart. Retrying with the same Idempotency-Key returns the
+    original order instead of placing a second one.
+    """
+    db = get_db()
+    user_id = current_user.mobile_number
+
+    if idempotency_key:
+        existing = await db["orders"].find_one({"user_id": user_id, "idempotency_key": idempotency_key})
+        if existing:
+            return Order(**existing)
+
+    snapshot = await catalog.get()
+    order = {}
+
+    async def place_order(session):
+        # Read the cart inside the transaction so a concurrent cart change
+        # conflicts with our delete instead of being silently dropped
+        cart = await db["carts"].find_one({"user_id": user_id}, {"items": 1}, session=session)
+        quantities = {}
+        for item in (cart or {}).get("items", []):
+            if item.get("quantity", 0) > 0:
+                quantities[item["product_id"]] = quantities.get(item["product_id"], 0) + item["quantity"]
+        if not quantities:
+            if idempotency_key:
+                # A retry that overlapped the first attempt: by the time this
+                # transaction (re)ran, the first one had placed the order and
+                # cleared the cart
+                existing = await db["orders"].find_one(
+                    {"user_id": user_id, "idempotency_key": idempotency_key}, session=session
+                )
+                if existing:
+                    order.clear()
+                    order.update(existing)
+                    return
+            raise HTTPException(status_code=400, detail="Cart is empty")
+
+        prices = snapshot.prices
+        missing = [pid for pid in quantities if pid not in prices]
+        if missing:
+            docs = await db["products"].find(
+                {"_id": {"$in": [ObjectId(pid) for pid in missing if ObjectId.is_valid(pid)]}},
+                {"image": 0}, session=session
+            ).to_list(length=len(missing))
+            prices = {**prices, **{str(d["_id"]): price_entry(d) for d in docs}}
+            if len(docs) < len(missing):
+                raise HTTPException(status_code=400, detail="Cart contains products that no longer exist")
+
+        # A line only matches if enough stock is left; any miss fails the order
+        result = await db["products"].bulk_write([
+            UpdateOne({"_id": ObjectId(pid), "stock": {"$gte": qty}}, {"$inc": {"stock": -qty}})
+            for pid, qty in quantities.items()
+        ], ordered=False, session=session)
+        if result.matched_count < len(quantities):
+            raise _InsufficientStock(quantities)
+
+        lines = [{
+            "product_id": pid,
+            "name": prices[pid].name,
+            "quantity": qty,
+            "unit_price": prices[pid].price,
+            "line_total": prices[pid].price * qty
+        } for pid, qty in quantities.items()]
+        order.clear()
+        order.update({
+            "_id": ObjectId(),
+            "user_id": user_id,
+            "items": lines,
+            "total_price": sum(l["line_total"] for l in lines),
+            "total_items": sum(quantities.values()),
+            "status": "placed",
+            "created_at": datetime.utcnow()
+        })
+        if idempotency_key:
+            order["idempotency_key"] = idempotency_key
+
+        await db["orders"].insert_one(order, session=session)
+        await db["carts"].delete_one({"user_id": user_id}, session=session)
+
+    try:
+        async with await get_client().start_session() as session:
+            await session.with_transaction(place_order)
+    except _InsufficientStock as e:
+        quantities = e.args[0]
+        docs = await db["products"].find(
+            {"_id": {"$in": [ObjectId(pid) for pid in quantities]}}, {"stock": 1, "name": 1}
+        ).to_list(length=len(quantities))
+        short = [
+            {"product_id": str(d["_id"]), "name": d.get("name"), "requested": quantities[str(d["_id"])], "available": d.get("stock", 0)}
+            for d in docs if d.get("stock", 0) < quantities[str(d["_id"])]
+        ]
+        raise HTTPException(status_code=409, detail={"message": "Insufficient stock", "items": short})
+    except DuplicateKeyError:
+        # A concurrent retry with the same key won the race
+        existing = await db["orders"].find_one({"user_id": user_id, "idempotency_key": idempotency_key})
+        if not existing:
+            raise
+        return Order(**existing)
+
+    # Stock changed, so cart totals and listings need a fresh snapshot
+    catalog.mark_stale()
+    return Order(**order)
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Optional
+import numpy as np
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from app.models.harvest import HarvestRequest
+from app.services.harvest_prediction import build_prediction, get_weather_data, normalize_location
+from app.services.crop_model import CROP_DURATIONS, crop_codes, day_array, maturity_batch, temperature_window
+from database import get_db
+
+logger = logging.getLogger(__name__)
+
+# Nightly precomputation of harvest advisories. Every user with crops, sowing
+# dates and a location is walked in cursor batches; weather is fetched once
+# per location cell for the whole run, recommendations go through the same
+# rules/cache/Gemini path as the live endpoint under a concurrency bound,
+# and results are upserted into `advisories` (one document per user and
+# crop) so GET /api/advisories/me is a single indexed read.
+ADVISORIES = "advisories"
+JOB_LOCKS = "job_locks"
+LOCK_ID = "advisories"
+
+BATCH_SIZE = int(os.getenv("ADVISORY_BATCH_SIZE", "500"))
+CONCURRENCY = int(os.getenv("ADVISORY_CONCURRENCY", "16"))
+LOCK_LEASE_SECONDS = 3600
+# UTC hour for the in-process nightly run; empty disables it (e.g. when cron
+# runs run_advisories.py instead)
+RUN_HOUR_UTC = os.getenv("ADVISORY_RUN_HOUR_UTC", "20")
+
+_scheduler_task: Optional[asyncio.Task] = None
+
+
+def _location_string(location: Optional[dict]) -> Optional[str]:
+    coordinates = (location or {}).get("coordinates") or []
+    # [0, 0] is the placeholder given to auto-created users
+    if len(coordinates) != 2 or coordinates == [0.0, 0.0]:
+        return None
+    long, lat = coordinates
+    return f"{lat},{long}"
+
+
+async def _acquire_lock(db, owner: str) -> bool:
+    now = datetime.utcnow()
+    try:
+        await db[JOB_LOCKS].update_one(
+            {"_id": LOCK_ID, "$or": [{"locked_until": None}, {"locked_until": {"$lt": now}}]},
+            {"$set": {"locked_until": now + timedelta(seconds=LOCK_LEASE_SECONDS), "owner": owner}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The lock document exists and its lease hasn't expired
+        return False
+    return True
+
+
+async def _renew_lock(db, owner: str):
+    await db[JOB_LOCKS].update_one(
+        {"_id": LOCK_ID, "owner": owner},
+        {"$set": {"locked_until": datetime.utcnow() + timedelta(seconds=LOCK_LEASE_SECONDS)}}
+    )
+
+
+async def _release_lock(db, owner: str, finished_at: Optional[datetime] = None):
+    update = {"locked_until": None}
+    if finished_at:
+        update["last_completed_at"] = finished_at
+    await db[JOB_LOCKS].update_one({"_id": LOCK_ID, "owner": owner}, {"$set": update})
+
+
+async def _advise(user: dict, crop: str, sown: datetime, location: str, days: int, maturity: float,
+                  forecast: Optional[dict], semaphore) -> UpdateOne:
+    request = HarvestRequest(crop_type=crop, sowing_date=sown.date(), location=location)
+    async with semaphore:
+        result = await build_prediction(request, days, maturity, forecast, record=False)
+
+    advisory = result.dict()
+    advisory.update({
+        "sowing_date": sown,
+        "location": location,
+        "computed_at": datetime.utcnow(),
+    })
+    return UpdateOne({"user_id": user["_id"], "crop_type": crop}, {"$set": advisory}, upsert=True)
+
+
+async def _limited(semaphore, coro):
+    async with semaphore:
+        return await coro
+
+
+async def run_advisories(db, batch_size: int = BATCH_SIZE, concurrency: int = CONCURRENCY) -> Optional[int]:
+    """
+    Recomputes every advisory. Returns the number written, or None if
+    another process holds the job lock.
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    if not await _acquire_lock(db, owner):
+        return None
+
+    started_at = datetime.utcnow()
+    semaphore = asyncio.Semaphore(concurrency)
+    # One forecast per location cell for the whole run
+    forecasts = {}
+    # (user_id, crop) of fields whose advisory failed this run
+    failed = []
+    written = 0
+    try:
+        cursor = db["users"].find(
+            {"crops_rotation.0": {"$exists": True}, "crop_sowing_dates": {"$ne": {}}, "location": {"$ne": None}},
+            {"crops_rotation": 1, "crop_sowing_dates": 1, "location": 1}
+        ).batch_size(batch_size)
+
+        batch = []
+        async for user in cursor:
+            batch.append(user)
+            if len(batch) >= batch_size:
+                written += await _process_batch(db, batch, forecasts, semaphore, failed)
+                await _renew_lock(db, owner)
+                batch = []
+        if batch:
+            written += await _process_batch(db, batch, forecasts, semaphore, failed)
+
+        # Crops dropped from a rotation (or users who lost their location).
+        # Fields that failed this run keep their last good advisory.
+        stale = {"computed_at": {"$lt": started_at}}
+        if failed:
+            stale["$nor"] = [{"user_id": user_id, "crop_type": crop} for user_id, crop in failed]
+        await db[ADVISORIES].delete_many(stale)
+    except BaseException:
+        await _release_lock(db, owner)
+        raise
+    await _release_lock(db, owner, finished_at=datetime.utcnow())
+    return written
+
+
+async def _process_batch(db, users: list, forecasts: dict, semaphore, failed: list) -> int:
+    fields = []
+    for user in users:
+        location = _location_string(user.get("location"))
+        if not location:
+            continue
+        sowing_dates = user.get("crop_sowing_dates") or {}
+        for crop in user.get("crops_rotation") or []:
+            if crop in CROP_DURATIONS and sowing_dates.get(crop):
+                fields.append((user, crop, sowing_dates[crop], location))
+    if not fields:
+        return 0
+
+    # Weather for every location cell in the batch; maturity needs its temperatures
+    cells = [normalize_location(f[3]) for f in fields]
+    for cell, field in zip(cells, fields):
+        if cell not in forecasts:
+            forecasts[cell] = asyncio.ensure_future(_limited(semaphore, get_weather_data(field[3])))
+    batch_cells = list(dict.fromkeys(cells))
+    cell_forecasts = dict(zip(batch_cells, await asyncio.gather(*(forecasts[c] for c in batch_cells))))
+    windows = {
+        cell: temperature_window(forecast.get("daily_temps") if forecast else None)
+        for cell, forecast in cell_forecasts.items()
+    }
+
+    # Maturity for the whole batch in one vectorized call
+    days, maturity = maturity_batch(
+        crop_codes([f[1] for f in fields]),
+        day_array([f[2].date() for f in fields]),
+        daily_temps=np.stack([windows[cell] for cell in cells])
+    )
+    # Skip sowing dates in the future
+    current = [(i, field) for i, field in enumerate(fields) if days[i] >= 0]
+    work = [
+        _advise(user, crop, sown, location, int(days[i]), float(maturity[i]), cell_forecasts[cells[i]], semaphore)
+        for i, (user, crop, sown, location) in current
+    ]
+
+    results = await asyncio.gather(*work, return_exceptions=True)
+    operations = []
+    for (_, (user, crop, _, _)), result in zip(current, results):
+        if isinstance(result, Exception):
+            logger.error(f"Advisory failed: {result!r}")
+            failed.append((user["_id"], crop))
+        else:
+            operations.append(result)
+    if operations:
+        await db[ADVISORIES].bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def _seconds_until_next_run(hour: int) -> float:
+    now = datetime.utcnow()
+    next_run = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+async def _run_nightly(hour: int):
+    while True:
+        await asyncio.sleep(_seconds_until_next_run(hour))
+        try:
+            written = await run_advisories(get_db())
+            if written is None:
+                logger.info("Advisory run skipped: another process holds the lock")
+            else:
+                logger.info(f"Advisory run wrote {written} advisories")
+        except Exception as e:
+            logger.exception(f"Advisory run failed: {e}")
+
+
+def start_advisory_scheduler():
+    global _scheduler_task
+    if RUN_HOUR_UTC and _scheduler_task is None:
+        _scheduler_task = asyncio.create_task(_run_nightly(int(RUN_HOUR_UTC)))
+
+
+async def stop_advisory_scheduler():
+    global _scheduler_task
+    if _scheduler_task:
+        _scheduler_task.cancel()
+        try:
+            await _scheduler_task
+        except asyncio.CancelledError:
+            pass
+        _scheduler_task = None
@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from pydantic import TypeAdapter
+from app.models.store import Product
+from app.middleware.compression import MIN_BYTES, THREAD_MIN_BYTES, compress
+from app.services.product_query import DISCOUNT_BACKFILL, expected_discount
+from database import get_db
+
+logger = logging.getLogger(__name__)
+
+# The product catalog changes a few times a day, so /store/products is served
+# from an immutable in-process snapshot: product models, per-category lists
+# and their pre-encoded JSON bodies with content-hash ETags; gzip/brotli
+# variants are compressed on first request and kept with the snapshot. The snapshot is
+# rebuilt every CATALOG_REFRESH_SECONDS, or on the next read after
+# mark_stale() is called by code that changes products.
+REFRESH_INTERVAL_SECONDS = float(os.getenv("CATALOG_REFRESH_SECONDS", "300"))
+
+_products_adapter = TypeAdapter(List[Product])
+
+
+class PriceEntry(NamedTuple):
+    """What pricing a cart line needs, without the product's base64 image."""
+    price: float
+    stock: int
+    name: str
+    thumbnail: str
+
+
+def thumbnail_url(product_id) -> str:
+    return f"/store/products/{product_id}/image"
+
+
+def price_entry(doc: dict) -> PriceEntry:
+    return PriceEntry(
+        price=doc.get("our_price", 0.0),
+        stock=doc.get("stock", 0),
+        name=doc.get("name", ""),
+        thumbnail=thumbnail_url(doc["_id"]),
+    )
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+class CatalogSnapshot:
+    def __init__(self, version: int, products: List[Product]):
+        self.version = version
+        self.products = products
+        self.loaded_at = time.time()
+
+        self.by_id: Dict[str, Product] = {str(p.id): p for p in products}
+        # Compact price/stock index used to total carts
+        self.prices: Dict[str, PriceEntry] = {
+            pid: PriceEntry(p.our_price, p.stock, p.name, thumbnail_url(pid))
+            for pid, p in self.by_id.items()
+        }
+        self.by_category: Dict[str, List[Product]] = {}
+        for p in products:
+            self.by_category.setdefault(p.category, []).append(p)
+
+        self._bodies: Dict[Optional[str], Tuple[bytes, str]] = {}
+        for key, items in [(None, products), *self.by_category.items()]:
+            body = _products_adapter.dump_json(items, by_alias=True)
+            self._bodies[key] = (body, _etag(body))
+        # (category, encoding) -> compressed body and its ETag
+        self._encoded: Dict[Tuple[Optional[str], str], Tuple[bytes, str]] = {}
+
+    @property
+    def etag(self) -> str:
+        return self._bodies[None][1]
+
+    def body_for(self, category: Optional[str] = None, encoding: Optional[str] = None) -> Tuple[bytes, str]:
+        """
+        Returns the product list JSON for a category (or all) and its ETag,
+        compressed with `encoding` ("gzip"/"br") when given and worthwhile.
+        Use encoding_applies() to tell which one came back.
+        """
+        body, etag = self._bodies.get(category) or (b"[]", _etag(b"[]"))
+        if not self.encoding_applies(category, encoding):
+            return body, etag
+        key = (category, encoding)
+        if key not in self._encoded:
+            # Each encoding is a different representation, so it gets its own ETag
+            self._encoded[key] = (compress(body, encoding), f'{etag[:-1]}-{encoding}"')
+        return self._encoded[key]
+
+    def encoding_applies(self, category: Optional[str], encoding: Optional[str]) -> bool:
+        body = self._bodies.get(category, (b"",))[0]
+        return encoding is not None and len(body) >= MIN_BYTES
+
+    def needs_compressing(self, category: Optional[str], encoding: Optional[str]) -> bool:
+        """True if body_for() would compress a large body now, i.e. is worth a thread."""
+        body = self._bodies.get(category, (b"",))[0]
+        return self.encoding_applies(category, encoding) and (category, encoding) not in self._encoded \
+            and len(body) >= THREAD_MIN_BYTES
+
+
+class ProductCatalog:
+    def __init__(self):
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._stale = True
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version if self._snapshot else 0
+
+    def mark_stale(self):
+        self._stale = True
+
+    async def get(self) -> CatalogSnapshot:
+        if self._stale or self._snapshot is None:
+            await self.refresh()
+        return self._snapshot
+
+    async def refresh(self):
+        async with self._lock:
+            # Another request may have refreshed while we waited for the lock
+            if not self._stale and self._snapshot is not None:
+                return
+            self._stale = False
+            try:
+                docs = await get_db()["products"].find({}).to_list(length=None)
+                # Prices edited outside the API leave the sortable discount behind
+                stale = [d["_id"] for d in docs if d.get("discount") != expected_discount(d)]
+                if stale:
+                    await get_db()["products"].update_many({"_id": {"$in": stale}}, DISCOUNT_BACKFILL)
+            except Exception:
+                self._stale = True
+                raise
+
+            # Validating and encoding every product (base64 images included)
+            # takes long enough to stall other requests, so it runs in a thread
+            snapshot = await asyncio.to_thread(
+                lambda: CatalogSnapshot(self.version, [Product(**d) for d in docs])
+            )
+            # Only a change in content bumps the version
+            if self._snapshot is None or snapshot.etag != self._snapshot.etag:
+                snapshot.version = self.version + 1
+            self._snapshot = snapshot
+
+    async def _refresh_periodically(self):
+        while True:
+            await asyncio.sleep(REFRESH_INTERVAL_SECONDS)
+            self.mark_stale()
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Catalog refresh failed: {e}")
+
+    async def start(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.warning(f"Initial catalog load failed: {e}")
+        self._task = asyncio.create_task(self._refresh_periodically())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+catalog = ProductCatalog()
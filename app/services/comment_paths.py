@@ -0,0 +1,29 @@
+from bson import ObjectId
+from pymongo import UpdateOne
+
+# Comments written before threading have no materialized path, so the
+# path-range queries in get_comments never return them. They are all top
+# level, which makes their path their own id. Run at startup and by
+# migrate_comment_paths.py; a no-op once every comment has a path.
+BATCH_SIZE = 1000
+
+
+async def backfill_comment_paths(db, batch_size: int = BATCH_SIZE) -> int:
+    """Gives pre-threading comments a path (and an ObjectId post_id). Returns the number updated."""
+    cursor = db["community_comments"].find({"path": {"$exists": False}}, {"_id": 1, "post_id": 1})
+    ops = []
+    updated = 0
+    async for c in cursor:
+        update = {"path": str(c["_id"]), "depth": 0, "reply_count": 0, "parent_id": None}
+        # Older comments were stored with string post ids
+        if isinstance(c.get("post_id"), str) and ObjectId.is_valid(c["post_id"]):
+            update["post_id"] = ObjectId(c["post_id"])
+        ops.append(UpdateOne({"_id": c["_id"]}, {"$set": update}))
+        if len(ops) >= batch_size:
+            result = await db["community_comments"].bulk_write(ops, ordered=False)
+            updated += result.modified_count
+            ops = []
+    if ops:
+        result = await db["community_comments"].bulk_write(ops, ordered=False)
+        updated += result.modified_count
+    return updated
@@ -0,0 +1,63 @@
+from typing import List, Optional
+from app.services.pagination import encode_cursor, decode_cursor, keyset_filter
+from app.services.tag_stats import clean_tags
+
+# Text index over the searchable post fields. Titles and tags are short and
+# deliberate, so they weigh more than a match somewhere in the body.
+TEXT_INDEX_NAME = "post_text_search"
+TEXT_INDEX_FIELDS = [("title", "text"), ("content", "text"), ("tags", "text")]
+TEXT_INDEX_WEIGHTS = {"title": 10, "tags": 5, "content": 1}
+
+MAX_TAG_FACETS = 20
+
+
+def build_search_pipeline(
+    q: str,
+    tags: Optional[List[str]] = None,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+):
+    """
+    Builds a single aggregation that ranks posts by text score and returns
+    one page of results plus tag facet counts over the whole match set.
+
+    Pagination is keyset based on (score, _id) so deep pages never skip.
+    One extra result is fetched to tell whether a next page exists.
+    """
+    match = {"$text": {"$search": q}, "deleted_at": None}
+    # Tags are stored the way tag_stats counts them, so "Wheat " finds "wheat"
+    tags = clean_tags(tags)
+    if tags:
+        match["tags"] = {"$all": tags}
+
+    page = []
+    if cursor:
+        last_score, last_id = decode_cursor(cursor, 2)
+        page.append({"$match": keyset_filter("score", last_score, last_id, descending=True)})
+    page += [
+        {"$sort": {"score": -1, "_id": -1}},
+        {"$limit": limit + 1},
+    ]
+
+    return [
+        {"$match": match},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+        {"$facet": {
+            "results": page,
+            "tag_facets": [
+                {"$unwind": "$tags"},
+                {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}},
+                {"$limit": MAX_TAG_FACETS},
+            ],
+        }},
+    ]
+
+
+def split_page(results: list, limit: int):
+    """Trims the look-ahead result and returns (page, next_cursor)."""
+    if len(results) <= limit:
+        return results, None
+    page = results[:limit]
+    last = page[-1]
+    return page, encode_cursor(last["score"], last["_id"])
@@ -0,0 +1,125 @@
+from datetime import date
+from typing import NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+
+# Crop maturity from accumulated growing-degree-days (GDD), computed for many
+# fields at once with NumPy.
+#
+# Daily GDD is clip(mean_temp, base, upper) - base. Each crop needs
+# duration_days * (reference_temp - base) GDD to mature, i.e. its nominal
+# duration at its reference temperature. Progress is expressed in
+# "reference days": a day warmer than the reference counts for more than one,
+# a cooler day for less. Days with no temperature reading count as exactly
+# one, so without temperature data the result is the plain
+# days-since-sowing / duration figure.
+#
+# There is no observed temperature history, so temperature_window() builds
+# the series from monthly climate normals, with the most recent days taken
+# from the location's forecast (the best available estimate of the current
+# weather regime).
+
+
+class CropParams(NamedTuple):
+    duration_days: int
+    base_temp: float
+    reference_temp: float
+    upper_temp: float
+
+
+CROP_PARAMS = {
+    "Wheat": CropParams(120, 5.0, 20.0, 30.0),
+    "Rice": CropParams(135, 10.0, 27.0, 35.0),
+    "Cotton": CropParams(160, 15.5, 28.0, 38.0),
+    "Maize": CropParams(110, 10.0, 26.0, 30.0),
+    "Sugarcane": CropParams(365, 12.0, 26.0, 38.0),
+}
+
+CROP_DURATIONS = {crop: p.duration_days for crop, p in CROP_PARAMS.items()}
+
+# Days of temperatures fed to the model: the longest crop duration
+WINDOW_DAYS = max(CROP_DURATIONS.values())
+
+# Approximate all-India monthly mean temperatures (C), January first
+MONTHLY_NORMALS = np.array([17.9, 20.5, 24.6, 28.4, 30.6, 29.8, 27.9, 27.4, 27.1, 25.6, 22.0, 18.9], dtype=np.float32)
+
+CROP_NAMES = list(CROP_PARAMS)
+_CROP_INDEX = {crop: i for i, crop in enumerate(CROP_NAMES)}
+_DURATION = np.array([p.duration_days for p in CROP_PARAMS.values()], dtype=np.float64)
+_BASE = np.array([p.base_temp for p in CROP_PARAMS.values()], dtype=np.float32)
+_UPPER = np.array([p.upper_temp for p in CROP_PARAMS.values()], dtype=np.float32)
+_REFERENCE_GDD = np.array([p.reference_temp - p.base_temp for p in CROP_PARAMS.values()], dtype=np.float32)
+
+
+def crop_codes(crops: Sequence[str]) -> np.ndarray:
+    """Crop names to indices into CROP_NAMES; -1 for unknown crops."""
+    return np.fromiter((_CROP_INDEX.get(c, -1) for c in crops), dtype=np.int64, count=len(crops))
+
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def day_array(dates: Sequence[date]) -> np.ndarray:
+    """Dates to a datetime64[D] array (much faster than np.array(dates))."""
+    ordinals = np.fromiter((d.toordinal() for d in dates), dtype=np.int64, count=len(dates))
+    return (ordinals - _EPOCH_ORDINAL).astype("datetime64[D]")
+
+
+def temperature_window(recent: Optional[Sequence[float]] = None, today: Optional[date] = None,
+                       window: int = WINDOW_DAYS) -> np.ndarray:
+    """
+    Daily mean temperatures for the `window` days ending yesterday, laid out
+    as one row of maturity_batch's `daily_temps`. Each day is its month's
+    normal, except the last len(recent) days, which are `recent` in order.
+    """
+    today = np.datetime64(today or date.today(), "D")
+    months = (today - np.arange(window, 0, -1)).astype("datetime64[M]").astype(np.int64) % 12
+    temps = MONTHLY_NORMALS[months]
+    if recent:
+        recent = np.asarray(recent[:window], dtype=np.float32)
+        temps[window - len(recent):] = recent
+    return temps
+
+
+def maturity_batch(
+    codes: np.ndarray,
+    sowing_dates: np.ndarray,
+    today: Optional[date] = None,
+    daily_temps: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Days since sowing and maturity percent (0-100, 2 decimals) per field.
+
+    codes: crop indices from crop_codes(). Unknown crops get NaN maturity.
+    sowing_dates: datetime64[D] array. Future dates give negative days.
+    daily_temps: optional (fields, window) daily mean temperatures for the
+        `window` days ending yesterday (column -1). NaN marks a missing value.
+    """
+    today = np.datetime64(today or date.today(), "D")
+    days = (today - sowing_dates.astype("datetime64[D]")).astype(np.int64)
+    known = codes >= 0
+    safe_codes = np.where(known, codes, 0)
+
+    reference_days = days.astype(np.float64)
+    if daily_temps is not None:
+        window = daily_temps.shape[1]
+        base = _BASE[safe_codes][:, None]
+        gdd = np.clip(daily_temps, base, _UPPER[safe_codes][:, None]) - base
+        # Column j is the day (window - j) days ago; only count days since sowing
+        days_ago = np.arange(window, 0, -1)
+        counted = (days_ago[None, :] <= days[:, None]) & ~np.isnan(daily_temps)
+        ratio = np.where(counted, gdd, 0.0).sum(axis=1) / _REFERENCE_GDD[safe_codes]
+        reference_days += ratio - counted.sum(axis=1)
+
+    maturity = np.minimum(reference_days / _DURATION[safe_codes] * 100, 100.0)
+    maturity = np.where(known, np.round(maturity, 2), np.nan)
+    return days, maturity
+
+
+def maturity_for(crop_type: str, sowing_date: date, today: Optional[date] = None,
+                 daily_temps: Optional[Sequence[float]] = None) -> Tuple[int, float]:
+    """Single-field convenience wrapper around maturity_batch."""
+    temps = None if daily_temps is None else np.asarray([daily_temps], dtype=np.float32)
+    days, maturity = maturity_batch(
+        crop_codes([crop_type]), day_array([sowing_date]), today, temps
+    )
+    return int(days[0]), float(maturity[0])
@@ -0,0 +1,145 @@
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+import bson
+from pymongo import monitoring
+from app.services.metrics import registry
+
+# Per-collection, per-command Mongo latency and error counts, fed by a
+# pymongo CommandListener registered on the client in database.py. Events
+# arrive on Motor's worker threads; a started event is matched to its
+# outcome by (connection, request id) to recover the collection name, which
+# only the started event carries.
+#
+# The same listener feeds a per-request DbStats through a context variable.
+# Motor runs each operation with a copy of the caller's context, so events
+# are attributed to the request (or track_db() block) that issued them.
+
+# Encoding every command and reply to count bytes isn't free; opt in
+TRACK_BYTES = os.getenv("DB_TRACK_BYTES", "").lower() in ("1", "true", "yes")
+# Commands kept per request for the slow-request log
+MAX_RECORDED_COMMANDS = 50
+
+DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+COMMAND_LATENCY = registry.histogram(
+    "mongodb_command_duration_seconds", "Mongo command latency", ("collection", "command"), DB_BUCKETS
+)
+COMMAND_ERRORS = registry.counter(
+    "mongodb_command_errors_total", "Mongo commands that failed", ("collection", "command")
+)
+
+
+def _collection(event: monitoring.CommandStartedEvent) -> str:
+    command = event.command
+    # getMore names its collection separately; other commands use their own key
+    target = command.get("collection") if event.command_name == "getMore" else command.get(event.command_name)
+    return target if isinstance(target, str) else "-"
+
+
+class DbStats:
+    """Mongo commands, time and bytes for one request."""
+
+    def __init__(self, parent: "DbStats" = None):
+        self.parent = parent
+        self.round_trips = 0
+        self.errors = 0
+        self.db_time = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        # (collection, command) -> count, for spotting queries issued in a loop
+        self.by_command = Counter()
+        # (collection, command, seconds), the first MAX_RECORDED_COMMANDS of them
+        self.commands = []
+        self._lock = threading.Lock()
+
+    def record(self, collection: str, command: str, seconds: float, sent: int, received: int, failed: bool):
+        with self._lock:
+            self.round_trips += 1
+            self.errors += failed
+            self.db_time += seconds
+            self.bytes_sent += sent
+            self.bytes_received += received
+            self.by_command[(collection, command)] += 1
+            if len(self.commands) < MAX_RECORDED_COMMANDS:
+                self.commands.append((collection, command, seconds))
+        # Nested trackers (a request inside track_db()) also count towards the outer one
+        if self.parent is not None:
+            self.parent.record(collection, command, seconds, sent, received, failed)
+
+    def repeated(self, threshold: int):
+        """(collection, command, count) issued at least `threshold` times."""
+        return [(coll, cmd, n) for (coll, cmd), n in self.by_command.most_common() if n >= threshold]
+
+    def summary(self) -> str:
+        text = f"{self.round_trips} Mongo commands in {self.db_time * 1000:.1f}ms"
+        if TRACK_BYTES:
+            text += f", {self.bytes_sent} B sent, {self.bytes_received} B received"
+        return text
+
+
+_current: ContextVar[Optional[DbStats]] = ContextVar("db_stats", default=None)
+
+
+def current_stats() -> Optional[DbStats]:
+    return _current.get()
+
+
+@contextmanager
+def track_db():
+    """Collects the Mongo commands issued inside the block into a DbStats."""
+    stats = DbStats(parent=_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def assert_max_round_trips(limit: int):
+    """
+    Fails if the block issues more than `limit` Mongo commands, e.g.
+
+        with assert_max_round_trips(3):
+            await client.post(f"/community/posts/{post_id}/vote", ...)
+    """
+    with track_db() as stats:
+        yield stats
+    if stats.round_trips > limit:
+        issued = ", ".join(f"{cmd} {coll}" for coll, cmd, _ in stats.commands)
+        raise AssertionError(f"Expected at most {limit} Mongo round trips, got {stats.round_trips}: {issued}")
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        sent = len(bson.encode(event.command)) if TRACK_BYTES and _current.get() is not None else 0
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (_collection(event), sent)
+
+    def _finish(self, event, failed: bool):
+        with self._lock:
+            collection, sent = self._pending.pop((event.connection_id, event.request_id), ("-", 0))
+        seconds = event.duration_micros / 1e6
+        COMMAND_LATENCY.observe(seconds, collection, event.command_name)
+        stats = _current.get()
+        if stats is not None:
+            received = len(bson.encode(event.reply)) if TRACK_BYTES and not failed else 0
+            stats.record(collection, event.command_name, seconds, sent, received, failed)
+        return collection
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        COMMAND_ERRORS.inc(self._finish(event, failed=True), event.command_name)
+
+
+command_listener = CommandMetricsListener()
@@ -0,0 +1,209 @@
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+from database import get_db
+
+logger = logging.getLogger(__name__)
+
+# One change stream per process feeds every /community/stream subscriber.
+# Each subscriber has a bounded, coalescing backlog: repeated vote/comment
+# count changes for the same post collapse into one pending event, and a
+# subscriber whose backlog still overflows is disconnected (it gets an
+# "overflow" event telling it to refetch).
+MAX_SUBSCRIBERS = int(os.getenv("FEED_MAX_SUBSCRIBERS", "5000"))
+MAX_PENDING_EVENTS = int(os.getenv("FEED_MAX_PENDING_EVENTS", "256"))
+
+STATS_FIELDS = ("upvotes", "downvotes", "comment_count")
+EDIT_FIELDS = ("title", "tags")
+
+WATCH_PIPELINE = [
+    {"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}},
+    # Post bodies can be long; subscribers get a summary and fetch the rest
+    {"$project": {
+        "operationType": 1,
+        "documentKey": 1,
+        "updateDescription.updatedFields": 1,
+        "fullDocument._id": 1,
+        "fullDocument.title": 1,
+        "fullDocument.tags": 1,
+        "fullDocument.author_name": 1,
+        "fullDocument.created_at": 1,
+    }},
+]
+
+
+def _jsonable(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class FeedEvent:
+    __slots__ = ("type", "post_id", "data", "_encoded")
+
+    def __init__(self, type: str, post_id: str, data: dict):
+        self.type = type
+        self.post_id = post_id
+        self.data = data
+        self._encoded = None
+
+    @property
+    def key(self):
+        return (self.type, self.post_id)
+
+    def merge(self, newer: "FeedEvent") -> "FeedEvent":
+        return FeedEvent(self.type, self.post_id, {**self.data, **newer.data})
+
+    def encode(self) -> bytes:
+        # Encoded once and shared by every subscriber it is delivered to
+        if self._encoded is None:
+            payload = json.dumps({"post_id": self.post_id, **self.data}, default=_jsonable)
+            self._encoded = f"event: {self.type}\ndata: {payload}\n\n".encode("utf-8")
+        return self._encoded
+
+
+class Subscriber:
+    def __init__(self, max_pending: int = MAX_PENDING_EVENTS):
+        self.max_pending = max_pending
+        self.overflowed = False
+        self.closed = False
+        self._pending = OrderedDict()
+        self._ready = asyncio.Event()
+
+    def push(self, event: FeedEvent) -> bool:
+        """Queues or coalesces an event. Returns False if the backlog is full."""
+        existing = self._pending.get(event.key)
+        if existing is not None:
+            self._pending[event.key] = existing.merge(event)
+        elif len(self._pending) >= self.max_pending:
+            return False
+        else:
+            self._pending[event.key] = event
+        self._ready.set()
+        return True
+
+    async def next_batch(self, timeout: float) -> list:
+        """Waits up to `timeout` seconds and returns every pending event."""
+        if not self._pending and not self.closed:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+        self._ready.clear()
+        events = list(self._pending.values())
+        self._pending.clear()
+        return events
+
+    def close(self, overflowed: bool = False):
+        self.overflowed = overflowed
+        self.closed = True
+        self._ready.set()
+
+
+class FeedBroadcaster:
+    def __init__(self, collection: str = "community_posts"):
+        self.collection = collection
+        self._subscribers = set()
+        self._task: Optional[asyncio.Task] = None
+        self._resume_token = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Optional[Subscriber]:
+        if len(self._subscribers) >= MAX_SUBSCRIBERS:
+            return None
+        sub = Subscriber()
+        self._subscribers.add(sub)
+        # The watcher is started lazily by the first subscriber
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._watch())
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self._subscribers.discard(sub)
+
+    def publish(self, event: FeedEvent):
+        for sub in list(self._subscribers):
+            if not sub.push(event):
+                # Slow consumer: drop it rather than buffer without bound
+                self._subscribers.discard(sub)
+                sub.close(overflowed=True)
+
+    def _to_event(self, change: dict) -> Optional[FeedEvent]:
+        op = change["operationType"]
+        post_id = str(change["documentKey"]["_id"])
+
+        if op == "insert":
+            doc = change.get("fullDocument", {})
+            data = {k: _jsonable(v) for k, v in doc.items() if k != "_id"}
+            return FeedEvent("post_created", post_id, data)
+        if op == "delete":
+            return FeedEvent("post_deleted", post_id, {})
+        if op == "replace":
+            return FeedEvent("post_updated", post_id, {})
+
+        fields = change.get("updateDescription", {}).get("updatedFields", {})
+        if fields.get("deleted_at"):
+            return FeedEvent("post_deleted", post_id, {})
+        stats = {k: fields[k] for k in STATS_FIELDS if k in fields}
+        if stats:
+            return FeedEvent("post_stats", post_id, stats)
+        edits = {k: fields[k] for k in EDIT_FIELDS if k in fields}
+        if edits or "content" in fields:
+            return FeedEvent("post_updated", post_id, edits)
+        return None
+
+    async def _watch(self):
+        backoff = 1
+        while self._subscribers:
+            try:
+                collection = get_db()[self.collection]
+                async with collection.watch(WATCH_PIPELINE, resume_after=self._resume_token) as stream:
+                    backoff = 1
+                    while self._subscribers:
+                        change = await stream.try_next()
+                        self._resume_token = stream.resume_token
+                        if change is None:
+                            # try_next returns None after an empty getMore;
+                            # yield so an idle stream notices subscribers leaving
+                            await asyncio.sleep(0.1)
+                            continue
+                        event = self._to_event(change)
+                        if event:
+                            self.publish(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Feed change stream error: {e}")
+                if isinstance(e, OperationFailure):
+                    # Most likely the resume point fell off the oplog
+                    self._resume_token = None
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+        # Nobody is listening; the next subscriber starts from "now"
+        self._resume_token = None
+
+    async def stop(self):
+        for sub in list(self._subscribers):
+            sub.close()
+        self._subscribers.clear()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+feed = FeedBroadcaster()
@@ -0,0 +1,339 @@
+from typing import Callable
+from app.models.harvest import HarvestRequest, HarvestResponse, DecisionSource
+from app.services.cache import TTLCache
+from app.services.http_client import get_http_client
+from app.services.recommendation_cache import recommendation_cache, recommendation_key
+from app.services.harvest_rules import decide, record_decision
+from app.services.resilience import CircuitBreaker, CircuitOpenError, get_breaker, hedged
+from app.services.metrics import registry
+import asyncio
+import httpx
+import os
+import json
+import logging
+import time
+import google.generativeai as genai
+
+logger = logging.getLogger(__name__)
+
+# The harvest prediction pipeline: cached weather lookup, rules, cached
+# Gemini recommendation and fallback. Shared by the /api/harvest-predict
+# endpoints and the nightly advisory job.
+
+# Overridable so the weather call can be pointed at stub_upstreams.py
+WEATHER_API_URL = os.getenv("WEATHER_API_URL", "https://api.openweathermap.org/data/2.5/forecast")
+
+# Forecasts change roughly hourly; the derived values are cached per location
+WEATHER_CACHE_TTL_SECONDS = float(os.getenv("WEATHER_CACHE_TTL_SECONDS", "1800"))
+_weather_cache = TTLCache(maxsize=4096, ttl=WEATHER_CACHE_TTL_SECONDS)
+_weather_inflight = {}
+
+# Per-call caps; the router's deadline can cut a call shorter
+WEATHER_TIMEOUT_SECONDS = float(os.getenv("WEATHER_TIMEOUT_SECONDS", "5"))
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "20"))
+# Send a second weather request if the first hasn't answered in this long (0 = off)
+WEATHER_HEDGE_DELAY_SECONDS = float(os.getenv("WEATHER_HEDGE_DELAY_SECONDS", "0"))
+# Point Gemini at a local stub (stub_upstreams.py) instead of Google
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+
+weather_breaker = get_breaker("weather")
+gemini_breaker = get_breaker("gemini")
+
+UPSTREAM_CALLS = registry.counter(
+    "harvest_upstream_calls_total", "Weather and Gemini API calls by outcome", ("upstream", "outcome")
+)
+UPSTREAM_LATENCY = registry.histogram(
+    "harvest_upstream_duration_seconds", "Weather and Gemini API latency", ("upstream",)
+)
+WEATHER_LOOKUPS = registry.counter(
+    "harvest_weather_lookups_total", "Weather lookups by cache result (hit, shared, miss)", ("result",)
+)
+
+def normalize_location(location: str):
+    """Cache key for a location: lat/lon rounded to ~1 km, or a normalized city name."""
+    # Simple heuristic to check if location looks like lat,lon
+    if "," in location and any(c.isdigit() for c in location):
+        try:
+            lat, lon = location.split(",")
+            return ("coord", round(float(lat), 2), round(float(lon), 2))
+        except ValueError:
+            pass
+    return ("city", " ".join(location.lower().split()))
+
+async def get_weather_data(location: str, timeout: float = None):
+    """
+    Fetches weather data from OpenWeatherMap, cached per normalized location.
+    Returns None if it is unavailable or not ready within `timeout` seconds.
+    """
+    api_key = os.getenv("WEATHER_API_KEY")
+    if not api_key:
+        logger.warning("WEATHER_API_KEY not found.")
+        return None
+
+    key = normalize_location(location)
+    cached = _weather_cache.get(key)
+    if cached is not None:
+        WEATHER_LOOKUPS.inc("hit")
+        return cached
+
+    # Concurrent requests for the same place share one upstream call
+    task = _weather_inflight.get(key)
+    if task is not None:
+        WEATHER_LOOKUPS.inc("shared")
+    else:
+        WEATHER_LOOKUPS.inc("miss")
+        task = asyncio.ensure_future(_fetch_weather(key, api_key))
+        _weather_inflight[key] = task
+        task.add_done_callback(lambda _: _weather_inflight.pop(key, None))
+    try:
+        # A caller that runs out of time leaves the fetch running for the cache
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Weather lookup for {location} exceeded its {timeout:.1f}s budget")
+        return None
+
+def _is_upstream_failure(e: Exception) -> bool:
+    # A 4xx (e.g. unknown city) means the upstream is up and answering
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500 or e.response.status_code == 429
+    return True
+
+async def _call_upstream(breaker: CircuitBreaker, fn, timeout: float, is_failure=lambda e: True):
+    """breaker.call, counted on /metrics by upstream and outcome."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        result = await breaker.call(fn, timeout, is_failure=is_failure)
+        outcome = "ok"
+        return result
+    except CircuitOpenError:
+        outcome = "rejected"
+        raise
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        raise
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    finally:
+        UPSTREAM_CALLS.inc(breaker.name, outcome)
+        if outcome != "rejected":
+            UPSTREAM_LATENCY.observe(time.perf_counter() - start, breaker.name)
+
+async def _request_forecast(params: dict) -> dict:
+    response = await get_http_client().get(WEATHER_API_URL, params=params, timeout=WEATHER_TIMEOUT_SECONDS)
+    response.raise_for_status()
+    return response.json()
+
+async def _fetch_weather(key, api_key: str):
+    # Using OpenWeatherMap 5 day forecast API (free tier usually available)
+    params = {
+        "appid": api_key,
+        "units": "metric"
+    }
+    if key[0] == "coord":
+        params["lat"] = str(key[1])
+        params["lon"] = str(key[2])
+    else:
+        params["q"] = key[1]
+
+    try:
+        if WEATHER_HEDGE_DELAY_SECONDS > 0:
+            fetch = lambda: hedged(lambda: _request_forecast(params), WEATHER_HEDGE_DELAY_SECONDS)
+        else:
+            fetch = lambda: _request_forecast(params)
+        # Fails fast with CircuitOpenError while the weather API is unhealthy
+        data = await _call_upstream(weather_breaker, fetch, WEATHER_TIMEOUT_SECONDS, _is_upstream_failure)
+        
+        # Extract relevant info
+        # 5-day forecast returns list. We can calculate rain prob from "pop" (probability of precipitation)
+        forecast_list = data.get("list", [])
+        
+        # Avg Rain Probability (next 5 days approx 40 datapoints for 3hr intervals, let's take first 24 hrs or avg of all)
+        # "pop" is from 0 to 1.
+        pop_values = [item.get("pop", 0) for item in forecast_list]
+        avg_pop = sum(pop_values) / len(pop_values) if pop_values else 0
+        rain_probability = round(avg_pop * 100, 1)
+
+        # Max Wind Speed
+        wind_speeds = [item.get("wind", {}).get("speed", 0) for item in forecast_list]
+        max_wind_speed = max(wind_speeds) if wind_speeds else 0
+
+        # Storm Check (This is simplified. Weather codes 2xx are thunderstorms)
+        storm_alert = any(
+            str(weather.get("id", "")).startswith("2") 
+            for item in forecast_list 
+            for weather in item.get("weather", [])
+        )
+
+        # Daily mean temperature (UTC days, oldest first) for the crop maturity model
+        temps_by_day = {}
+        for item in forecast_list:
+            temp = item.get("main", {}).get("temp")
+            if temp is not None and "dt" in item:
+                temps_by_day.setdefault(item["dt"] // 86400, []).append(temp)
+        daily_temps = [round(sum(t) / len(t), 1) for _, t in sorted(temps_by_day.items())]
+
+        weather_summary = f"Rain Prob: {rain_probability}%, Max Wind: {max_wind_speed}km/h"
+        if storm_alert:
+            weather_summary += ", Storm Alert!"
+
+        weather = {
+            "rain_probability": rain_probability,
+            "wind_speed": max_wind_speed,
+            "storm_alert": storm_alert,
+            "daily_temps": daily_temps,
+            "summary": weather_summary
+        }
+        # Only successful lookups are cached; failures retry on the next request
+        _weather_cache.set(key, weather)
+        return weather
+
+    except Exception as e:
+        logger.warning(f"Weather API Error: {e!r}")
+        return None
+
+async def get_gemini_recommendation(data: dict, on_token: Callable[[str], None] = None):
+    """
+    Sends data to Gemini for reasoning. With `on_token`, the response is
+    streamed and each chunk of text is passed to it as it arrives.
+    """
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        logger.warning("GEMINI_API_KEY not found.")
+        return None
+
+    try:
+        if GEMINI_API_ENDPOINT:
+            genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+        else:
+            genai.configure(api_key=api_key)
+        model = genai.GenerativeModel('gemini-pro')
+
+        prompt = f"""
+        You are an agricultural advisory AI specialized in Indian farming conditions.
+
+        Analyze the farm data below and provide a harvest recommendation.
+
+        FARM DATA:
+        Crop Type: {data['crop_type']}
+        Days Since Sowing: {data['days_after_sowing']}
+        Maturity Percentage: {data['maturity_percent']}%
+        Location: {data['location']}
+        Rain Probability (Next 5 Days): {data.get('rain_probability', 'N/A')}%
+        Wind Speed: {data.get('wind_speed', 'N/A')} km/h
+        Storm Alert: {data.get('storm_alert', 'N/A')}
+
+        Decision Rules:
+        1. If maturity < 70%, recommend WAIT.
+        2. If maturity between 70% and 85%, analyze weather and decide.
+        3. If maturity > 85% and rain_probability > 60%, recommend HARVEST NOW.
+        4. If storm alert is true and maturity > 80%, recommend HIGH RISK – HARVEST IMMEDIATELY.
+        5. Otherwise recommend WAIT.
+
+        Return STRICT JSON in this format:
+        {{
+            "maturity_status": "",
+            "weather_risk_level": "LOW | MEDIUM | HIGH",
+            "recommendation": "HARVEST NOW | WAIT | HIGH RISK – HARVEST IMMEDIATELY",
+            "reasoning": "",
+            "farmer_advice": ""
+        }}
+        """
+        
+        # Enforce JSON generation
+        # The client's own retries would outlast our deadline; the breaker handles failures
+        options = {"retry": None, "timeout": GEMINI_TIMEOUT_SECONDS}
+        if GEMINI_API_ENDPOINT:
+            # The library's async client doesn't work over REST, so no token streaming here
+            generate = lambda: asyncio.to_thread(lambda: model.generate_content(prompt, request_options=options).text)
+        elif on_token:
+            async def generate():
+                chunks = []
+                async for chunk in await model.generate_content_async(prompt, stream=True, request_options=options):
+                    chunks.append(chunk.text)
+                    on_token(chunk.text)
+                return "".join(chunks)
+        else:
+            generate = lambda: _response_text(model.generate_content_async(prompt, request_options=options))
+        text = await _call_upstream(gemini_breaker, generate, GEMINI_TIMEOUT_SECONDS)
+        
+        # Clean response text (remove markdown code blocks if present)
+        text = text.replace("```json", "").replace("```", "").strip()
+        
+        return json.loads(text)
+
+    except Exception as e:
+        logger.warning(f"Gemini API Error: {e!r}")
+        return None
+
+async def _response_text(pending) -> str:
+    return (await pending).text
+
+async def build_prediction(request: HarvestRequest, days: int, maturity: float, forecast,
+                           timeout: float = None, on_token: Callable[[str], None] = None,
+                           record: bool = True) -> HarvestResponse:
+    """
+    Turns maturity and the forecast (None if unavailable) into a
+    recommendation, falling back if Gemini takes longer than `timeout`.
+    `on_token` receives Gemini's text as it streams, when it is called.
+    Decisions are counted for /api/harvest-predict/metrics, which covers
+    every API request (single, streamed and /batch); the nightly advisory
+    job passes record=False since nobody asked for those predictions.
+    """
+    # Default weather values if API fails
+    weather = forecast or {
+        "rain_probability": 0,
+        "wind_speed": 0,
+        "storm_alert": False,
+        "summary": "Weather data unavailable"
+    }
+
+    # Rules first; Gemini only for cases they leave open
+    ai_response = decide(maturity, forecast)
+    source = DecisionSource.RULES
+
+    if ai_response is None:
+        gemini_input = {
+            "crop_type": request.crop_type,
+            "days_after_sowing": days,
+            "maturity_percent": maturity,
+            "location": request.location,
+            **weather
+        }
+        try:
+            # Near-identical inputs (same crop, sowing week and district weather) share an answer
+            ai_response, cached = await asyncio.wait_for(recommendation_cache.get_or_compute(
+                recommendation_key(gemini_input),
+                lambda: get_gemini_recommendation(gemini_input, on_token)
+            ), timeout)
+            source = DecisionSource.CACHE if cached else DecisionSource.LLM
+        except asyncio.TimeoutError:
+            logger.warning(f"Gemini recommendation exceeded its {timeout:.1f}s budget")
+            ai_response = None
+
+    # Fallback if Gemini fails
+    if not ai_response:
+        source = DecisionSource.FALLBACK
+        ai_response = {
+            "maturity_status": "Calculated based on sowing date",
+            "weather_risk_level": "UNKNOWN",
+            "recommendation": "WAIT" if maturity < 85 else "HARVEST NOW",
+            "reasoning": "AI Service unavailable. Recommendation based on maturity only.",
+            "farmer_advice": "Please consult local experts."
+        }
+    if record:
+        record_decision(source.value)
+
+    # Construct Final Response
+    return HarvestResponse(
+        crop_type=request.crop_type,
+        days_after_sowing=days,
+        maturity_percent=maturity,
+        weather_summary=weather["summary"],
+        weather_risk_level=ai_response.get("weather_risk_level", "UNKNOWN"),
+        recommendation=ai_response.get("recommendation", "WAIT"),
+        reasoning=ai_response.get("reasoning", ""),
+        farmer_advice=ai_response.get("farmer_advice", ""),
+        decision_source=source
+    )
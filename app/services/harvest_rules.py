@@ -0,0 +1,103 @@
+from collections import Counter
+from typing import Optional
+from app.services import metrics
+
+# The hard decision rules from the Gemini prompt, evaluated locally. When they
+# settle the outcome the LLM is skipped; only the 70-85% maturity gray zone
+# (where the prompt asks the model to weigh the weather) goes to Gemini.
+WAIT = "WAIT"
+HARVEST_NOW = "HARVEST NOW"
+HIGH_RISK = "HIGH RISK – HARVEST IMMEDIATELY"
+
+GRAY_ZONE_MIN = 70
+GRAY_ZONE_MAX = 85
+STORM_MATURITY = 80
+RAIN_THRESHOLD = 60
+
+_decisions = Counter()
+
+
+def weather_risk_level(weather: Optional[dict]) -> str:
+    if not weather:
+        return "UNKNOWN"
+    if weather.get("storm_alert") or weather.get("rain_probability", 0) > RAIN_THRESHOLD:
+        return "HIGH"
+    if weather.get("rain_probability", 0) > 30 or weather.get("wind_speed", 0) > 10:
+        return "MEDIUM"
+    return "LOW"
+
+
+def _result(recommendation: str, risk: str, reasoning: str, advice: str) -> dict:
+    return {
+        "weather_risk_level": risk,
+        "recommendation": recommendation,
+        "reasoning": reasoning,
+        "farmer_advice": advice,
+    }
+
+
+def decide(maturity: float, weather: Optional[dict]) -> Optional[dict]:
+    """
+    Applies the decision rules. Returns a recommendation dict when they
+    fully decide the outcome, or None when the LLM should weigh in.
+    `weather` is None when the forecast is unavailable.
+    """
+    risk = weather_risk_level(weather)
+
+    if maturity < GRAY_ZONE_MIN:
+        return _result(
+            WAIT, risk,
+            f"Crop is {maturity}% mature, below the {GRAY_ZONE_MIN}% needed before harvest is considered.",
+            "Continue regular irrigation and pest monitoring until the crop matures further."
+        )
+
+    # Every remaining rule depends on the forecast
+    if weather is None:
+        return None
+
+    if weather.get("storm_alert") and maturity > STORM_MATURITY:
+        return _result(
+            HIGH_RISK, "HIGH",
+            f"A storm is forecast and the crop is already {maturity}% mature; waiting risks lodging and grain loss.",
+            "Arrange labour and machinery now and move the harvest to safe storage."
+        )
+
+    if maturity <= GRAY_ZONE_MAX:
+        return None
+
+    rain = weather.get("rain_probability", 0)
+    if rain > RAIN_THRESHOLD:
+        return _result(
+            HARVEST_NOW, risk,
+            f"Crop is {maturity}% mature and rain probability over the next days is {rain}%.",
+            "Harvest before the rain sets in and keep the produce covered while drying."
+        )
+    return _result(
+        WAIT, risk,
+        f"Crop is {maturity}% mature and the forecast ({rain}% rain) gives no reason to hurry.",
+        "Let the crop finish maturing and check the forecast again in a few days."
+    )
+
+
+def record_decision(source: str):
+    _decisions[source] += 1
+
+
+def decision_stats() -> dict:
+    total = sum(_decisions.values())
+    bypassed = _decisions["rules"] + _decisions["cache"]
+    return {
+        "total": total,
+        "by_source": dict(_decisions),
+        "llm_bypass_rate": round(bypassed / total, 4) if total else 0.0,
+    }
+
+
+def _decision_metrics():
+    counter = metrics.Counter("harvest_decisions_total", "Harvest predictions by decision source", ("source",))
+    for source, count in _decisions.items():
+        counter.inc(source, amount=count)
+    return [counter]
+
+
+metrics.registry.register_collector(_decision_metrics)
@@ -0,0 +1,201 @@
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Minimal Prometheus-style metrics: counters, gauges and histograms with
+# labels, rendered in the text exposition format by GET /metrics. Updates
+# take a lock because the Mongo command listener reports from Motor's
+# executor threads; everything else records from the event loop.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class _Child:
+    """One labelled series of a counter or gauge, with its labels resolved once."""
+    __slots__ = ("_lock", "_cell")
+
+    def __init__(self, lock, cell):
+        self._lock = lock
+        self._cell = cell
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._cell[0] += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        # labels -> [value], so children can update it without a lookup
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def _cell(self, labels: Tuple[str, ...]) -> list:
+        cell = self._values.get(labels)
+        if cell is None:
+            with self._lock:
+                cell = self._values.setdefault(labels, [0.0])
+        return cell
+
+    def labels(self, *labels: str) -> _Child:
+        """The series for `labels`, for callers that update it on a hot path."""
+        return _Child(self._lock, self._cell(labels))
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        cell = self._cell(labels)
+        with self._lock:
+            cell[0] += amount
+
+    def value(self, *labels: str) -> float:
+        cell = self._values.get(labels)
+        return cell[0] if cell is not None else 0.0
+
+    def samples(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return {labels: cell[0] for labels, cell in self._values.items()}
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, value in sorted(self.samples().items()):
+            lines.append(f"{self.name}{_label_text(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float):
+        cell = self._cell(labels)
+        with self._lock:
+            cell[0] = value
+
+
+class _HistogramChild:
+    __slots__ = ("_lock", "_buckets", "_entry")
+
+    def __init__(self, lock, buckets, entry):
+        self._lock = lock
+        self._buckets = buckets
+        self._entry = entry
+
+    def observe(self, value: float):
+        i = bisect_left(self._buckets, value)
+        entry = self._entry
+        with self._lock:
+            entry[0][i] += 1
+            entry[1] += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last is +Inf), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def _entry(self, labels: Tuple[str, ...]) -> list:
+        entry = self._values.get(labels)
+        if entry is None:
+            with self._lock:
+                entry = self._values.setdefault(labels, [[0] * (len(self.buckets) + 1), 0.0])
+        return entry
+
+    def labels(self, *labels: str) -> _HistogramChild:
+        """The series for `labels`, for callers that update it on a hot path."""
+        return _HistogramChild(self._lock, self.buckets, self._entry(labels))
+
+    def observe(self, value: float, *labels: str):
+        i = bisect_left(self.buckets, value)
+        entry = self._entry(labels)
+        with self._lock:
+            entry[0][i] += 1
+            entry[1] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            snapshot = {k: (list(v[0]), v[1]) for k, v in self._values.items()}
+        for labels, (counts, total) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_label_text(self.labelnames, labels, le)} {cumulative}")
+            label_text = _label_text(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {repr(total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[_Metric]]] = []
+
+    def _register(self, metric):
+        # Modules may be re-imported (e.g. by scripts); keep the first instance
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collect: Callable[[], Iterable[_Metric]]):
+        """`collect` builds metrics from current state at scrape time."""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for metric in collect():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
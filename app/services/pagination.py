@@ -0,0 +1,35 @@
+import base64
+from bson import json_util
+
+# Keyset cursors are the sort key values of the last item on a page, encoded
+# with extended JSON so ObjectIds, datetimes and floats round-trip exactly.
+
+
+def encode_cursor(*values) -> str:
+    raw = json_util.dumps(list(values)).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """Decodes a cursor holding `size` values. Raises ValueError if malformed."""
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def keyset_filter(field: str, value, last_id, descending: bool) -> dict:
+    """Matches documents after (value, last_id) in a (field, _id) ordering."""
+    op = "$lt" if descending else "$gt"
+    if value is None:
+        # Missing/null sorts before every value, and {"$gt": None} matches
+        # nothing, so the page after a null is spelled out
+        after_null = {field: None, "_id": {op: last_id}}
+        return after_null if descending else {"$or": [{field: {"$ne": None}}, after_null]}
+    return {"$or": [
+        {field: {op: value}},
+        {field: value, "_id": {op: last_id}},
+    ]}
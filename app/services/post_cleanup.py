@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+from database import get_db
+
+logger = logging.getLogger(__name__)
+
+# Deleting a post only tombstones it (sets deleted_at) and queues a job here.
+# The worker removes comments, their votes and post votes in bounded batches,
+# then the post itself. Jobs live in Mongo and every step is idempotent, so a
+# restarted (or different) worker simply picks the job up again. A job that
+# has been claimed CASCADE_MAX_ATTEMPTS times without finishing is marked
+# failed (failed_at, last_error) and left for someone to look at.
+#
+# Comments and votes written before ids were stored as ObjectIds carry them
+# as strings, so every reference is matched in both forms.
+DELETION_JOBS = "post_deletion_jobs"
+
+BATCH_SIZE = int(os.getenv("CASCADE_BATCH_SIZE", "500"))
+BATCH_PAUSE_SECONDS = float(os.getenv("CASCADE_BATCH_PAUSE_SECONDS", "0.05"))
+MAX_ATTEMPTS = int(os.getenv("CASCADE_MAX_ATTEMPTS", "10"))
+POLL_INTERVAL_SECONDS = 30
+LEASE_SECONDS = 60
+
+_wakeup = asyncio.Event()
+_worker_task: Optional[asyncio.Task] = None
+
+
+async def enqueue_post_deletion(db, post_id: ObjectId):
+    await db[DELETION_JOBS].update_one(
+        {"_id": post_id},
+        {"$setOnInsert": {"created_at": datetime.utcnow(), "lease_until": None, "attempts": 0}},
+        upsert=True
+    )
+    _wakeup.set()
+
+
+async def _claim_job(db):
+    now = datetime.utcnow()
+    return await db[DELETION_JOBS].find_one_and_update(
+        {"$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}], "failed_at": None},
+        {"$set": {"lease_until": now + timedelta(seconds=LEASE_SECONDS)}, "$inc": {"attempts": 1}},
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def _renew_lease(db, post_id: ObjectId):
+    await db[DELETION_JOBS].update_one(
+        {"_id": post_id},
+        {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)}}
+    )
+
+
+async def _fail_job(db, job: dict):
+    await db[DELETION_JOBS].update_one({"_id": job["_id"]}, {"$set": {"failed_at": datetime.utcnow()}})
+    logger.error(
+        f"Giving up on cascade delete of post {job['_id']} after {job['attempts'] - 1} attempts: "
+        f"{job.get('last_error', 'no error recorded')}"
+    )
+
+
+async def _next_batch(collection, query) -> list:
+    docs = await collection.find(query, {"_id": 1}).limit(BATCH_SIZE).to_list(length=BATCH_SIZE)
+    return [d["_id"] for d in docs]
+
+
+def _either_form(ids: list) -> dict:
+    return {"$in": ids + [str(i) for i in ids]}
+
+
+async def cascade_delete_post(db, post_id: ObjectId):
+    """Removes everything hanging off a tombstoned post, one batch at a time."""
+    while True:
+        comment_ids = await _next_batch(db["community_comments"], {"post_id": _either_form([post_id])})
+        if not comment_ids:
+            break
+        # Votes first, so a crash never leaves votes for comments that are gone
+        await db["comment_votes"].delete_many({"comment_id": _either_form(comment_ids)})
+        await db["community_comments"].delete_many({"_id": {"$in": comment_ids}})
+        await _renew_lease(db, post_id)
+        await asyncio.sleep(BATCH_PAUSE_SECONDS)
+
+    while True:
+        vote_ids = await _next_batch(db["post_votes"], {"post_id": _either_form([post_id])})
+        if not vote_ids:
+            break
+        await db["post_votes"].delete_many({"_id": {"$in": vote_ids}})
+        await _renew_lease(db, post_id)
+        await asyncio.sleep(BATCH_PAUSE_SECONDS)
+
+    await db["community_posts"].delete_one({"_id": post_id, "deleted_at": {"$ne": None}})
+    await db[DELETION_JOBS].delete_one({"_id": post_id})
+
+
+async def run_deletion_worker():
+    while True:
+        _wakeup.clear()
+        try:
+            db = get_db()
+            job = await _claim_job(db) if db is not None else None
+            if job:
+                if job["attempts"] > MAX_ATTEMPTS:
+                    await _fail_job(db, job)
+                    continue
+                try:
+                    await cascade_delete_post(db, job["_id"])
+                except Exception as e:
+                    # The lease is left to expire, which spaces out the retries
+                    await db[DELETION_JOBS].update_one({"_id": job["_id"]}, {"$set": {"last_error": repr(e)}})
+                    raise
+                continue
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"Post deletion worker error: {e}")
+
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=POLL_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_deletion_worker():
+    global _worker_task
+    if _worker_task is None:
+        _worker_task = asyncio.create_task(run_deletion_worker())
+
+
+async def stop_deletion_worker():
+    global _worker_task
+    if _worker_task:
+        _worker_task.cancel()
+        try:
+            await _worker_task
+        except asyncio.CancelledError:
+            pass
+        _worker_task = None
@@ -0,0 +1,87 @@
+from typing import Optional, Tuple
+from app.services.pagination import encode_cursor, decode_cursor, keyset_filter
+
+# sort option -> (field, descending). Each has a matching (field, _id) index.
+SORT_OPTIONS = {
+    "price_asc": ("our_price", False),
+    "price_desc": ("our_price", True),
+    "rating": ("rating", True),
+    "discount": ("discount", True),
+}
+
+PRODUCT_SORT_INDEXES = [[(field, 1), ("_id", 1)] for field in ("our_price", "rating", "discount")]
+
+# discount is materialized on each product so it can be indexed and sorted on.
+# There is no product write path in the API, so it is re-derived at startup
+# and whenever the catalog snapshot finds a stale value (see catalog.refresh).
+DISCOUNT_BACKFILL = [{"$set": {"discount": {"$subtract": ["$original_price", "$our_price"]}}}]
+DISCOUNT_STALE = {"$expr": {"$ne": ["$discount", {"$subtract": ["$original_price", "$our_price"]}]}}
+
+
+def expected_discount(doc: dict):
+    try:
+        return doc["original_price"] - doc["our_price"]
+    except (KeyError, TypeError):
+        return None
+
+
+def build_browse_pipelines(
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock: bool = False,
+    min_rating: Optional[float] = None,
+    sort: str = "price_asc",
+    cursor: Optional[str] = None,
+    limit: int = 20,
+) -> Tuple[list, list]:
+    """
+    Two aggregations: a keyset page of products, and a count per category.
+    The page applies every filter and the cursor before sorting, so it walks
+    the sort field's index from the cursor and stops after one page. The
+    counts ignore the category filter and the cursor, so they reflect every
+    category under the other filters.
+    """
+    field, descending = SORT_OPTIONS[sort]
+    direction = -1 if descending else 1
+
+    match = {}
+    if min_price is not None or max_price is not None:
+        match["our_price"] = {}
+        if min_price is not None:
+            match["our_price"]["$gte"] = min_price
+        if max_price is not None:
+            match["our_price"]["$lte"] = max_price
+    if in_stock:
+        match["stock"] = {"$gt": 0}
+    if min_rating is not None:
+        match["rating"] = {"$gte": min_rating}
+
+    page_match = dict(match)
+    if category:
+        page_match["category"] = category
+    if cursor:
+        last_value, last_id = decode_cursor(cursor, 2)
+        page_match = {"$and": [page_match, keyset_filter(field, last_value, last_id, descending)]}
+
+    items = [
+        {"$match": page_match},
+        {"$sort": {field: direction, "_id": direction}},
+        {"$limit": limit + 1},
+    ]
+    categories = [
+        {"$match": match},
+        {"$group": {"_id": "$category", "count": {"$sum": 1}}},
+        {"$sort": {"_id": 1}},
+    ]
+    return items, categories
+
+
+def split_page(items: list, limit: int, sort: str):
+    """Trims the look-ahead item and returns (page, next_cursor)."""
+    if len(items) <= limit:
+        return items, None
+    field, _ = SORT_OPTIONS[sort]
+    page = items[:limit]
+    last = page[-1]
+    return page, encode_cursor(last.get(field), last["_id"])
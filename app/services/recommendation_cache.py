@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional, Tuple
+from app.services.cache import TTLCache
+from database import get_db
+
+logger = logging.getLogger(__name__)
+
+# Memoizes Gemini harvest recommendations. The key is a hash of the prompt
+# inputs after bucketing, so farms with near-identical numbers in the same
+# place (typically the same crop and sowing week within one district) share
+# an answer. The location is in the prompt, so it is in the key too. An LRU
+# bounded in-memory tier sits in front of an optional Mongo tier
+# (GEMINI_CACHE_PERSIST=1) so a restart doesn't start cold.
+CACHE_TTL_SECONDS = float(os.getenv("GEMINI_CACHE_TTL_SECONDS", "21600"))
+CACHE_MAX_ENTRIES = int(os.getenv("GEMINI_CACHE_MAX_ENTRIES", "2048"))
+CACHE_PERSIST = os.getenv("GEMINI_CACHE_PERSIST", "0").lower() in ("1", "true", "yes")
+CACHE_COLLECTION = "gemini_cache"
+
+# Bucket widths for the numeric prompt inputs
+DAYS_BUCKET = 5
+MATURITY_BUCKET = 5
+RAIN_BUCKET = 10
+WIND_BUCKET = 2
+# Coordinates are rounded to a ~11 km cell
+LOCATION_DECIMALS = 1
+
+
+def _bucket(value, step: float):
+    try:
+        return int(float(value) // step * step)
+    except (TypeError, ValueError):
+        return None
+
+
+def _location_cell(location) -> str:
+    location = " ".join(str(location or "").lower().split())
+    if "," in location and any(c.isdigit() for c in location):
+        try:
+            lat, lon = location.split(",")
+            return f"{round(float(lat), LOCATION_DECIMALS)},{round(float(lon), LOCATION_DECIMALS)}"
+        except ValueError:
+            pass
+    return location
+
+
+def recommendation_key(data: dict) -> str:
+    normalized = {
+        "crop": data["crop_type"].strip().lower(),
+        "location": _location_cell(data.get("location")),
+        "days": _bucket(data["days_after_sowing"], DAYS_BUCKET),
+        "maturity": _bucket(data["maturity_percent"], MATURITY_BUCKET),
+        "rain": _bucket(data.get("rain_probability"), RAIN_BUCKET),
+        "wind": _bucket(data.get("wind_speed"), WIND_BUCKET),
+        "storm": bool(data.get("storm_alert")),
+    }
+    raw = json.dumps(normalized, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
+
+class RecommendationCache:
+    def __init__(self, ttl: float = CACHE_TTL_SECONDS, maxsize: int = CACHE_MAX_ENTRIES, persist: bool = CACHE_PERSIST):
+        self.ttl = ttl
+        self.persist = persist
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight = {}
+
+    async def get(self, key: str) -> Optional[dict]:
+        value = self._memory.get(key)
+        if value is not None or not self.persist:
+            return value
+
+        try:
+            doc = await get_db()[CACHE_COLLECTION].find_one(
+                {"_id": key, "expires_at": {"$gt": datetime.utcnow()}}
+            )
+        except Exception as e:
+            logger.warning(f"Recommendation cache read failed: {e}")
+            return None
+        if not doc:
+            return None
+        remaining = (doc["expires_at"] - datetime.utcnow()).total_seconds()
+        self._memory.set(key, doc["response"], ttl=remaining)
+        return doc["response"]
+
+    async def set(self, key: str, value: dict):
+        self._memory.set(key, value)
+        if not self.persist:
+            return
+        now = datetime.utcnow()
+        try:
+            await get_db()[CACHE_COLLECTION].update_one(
+                {"_id": key},
+                {"$set": {"response": value, "created_at": now, "expires_at": now + timedelta(seconds=self.ttl)}},
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Recommendation cache write failed: {e}")
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Optional[dict]]]) -> Tuple[Optional[dict], bool]:
+        """
+        Returns (value, cache_hit), computing the value on a miss. Concurrent
+        callers share one computation; only the caller that started it gets
+        cache_hit=False. Empty results (upstream failure) are not cached.
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value, True
+
+        task = self._inflight.get(key)
+        joined = task is not None
+        if not joined:
+            task = asyncio.ensure_future(self._compute_and_store(key, compute))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task), joined
+
+    async def _compute_and_store(self, key: str, compute):
+        value = await compute()
+        if value:
+            await self.set(key, value)
+        return value
+
+
+recommendation_cache = RecommendationCache()
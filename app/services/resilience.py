@@ -0,0 +1,169 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+from app.services import metrics
+
+# Guards for calls to external services: a per-request deadline budget, a
+# circuit breaker per upstream that fails fast while it is unhealthy, and
+# hedged requests that race a second attempt against a slow first one.
+FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+RESET_TIMEOUT_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class Deadline:
+    """Time left for a request, shared out between the calls it makes."""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def budget(self, share: float) -> float:
+        return self.remaining() * share
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_timeout` seconds. Then a single trial call is let through
+    (half-open): success closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.rejected = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+
+    def allow(self) -> bool:
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._trial_running:
+            self._trial_running = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_running = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.trips += 1
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    async def call(self, fn: Callable[[], Awaitable[T]], timeout: Optional[float] = None,
+                   is_failure: Callable[[Exception], bool] = lambda e: True) -> T:
+        """
+        Runs `fn` under the breaker, raising CircuitOpenError without calling
+        it while open. Exceptions for which `is_failure` is False (e.g. a 4xx
+        reply) are re-raised without counting against the upstream.
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        try:
+            result = await asyncio.wait_for(fn(), timeout)
+        except asyncio.CancelledError:
+            # The caller gave up; that says nothing about the upstream
+            self._trial_running = False
+            raise
+        except Exception as e:
+            if is_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self) -> dict:
+        state = self.state
+        if state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            state = HALF_OPEN
+        return {
+            "state": state,
+            "consecutive_failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(name)
+    return _breakers[name]
+
+
+def breaker_states() -> Dict[str, dict]:
+    return {name: breaker.snapshot() for name, breaker in _breakers.items()}
+
+
+def _breaker_metrics():
+    open_ = metrics.Gauge("circuit_breaker_open", "1 while the upstream's breaker is open or half open", ("upstream",))
+    trips = metrics.Counter("circuit_breaker_trips_total", "Times the breaker opened", ("upstream",))
+    rejected = metrics.Counter("circuit_breaker_rejected_total", "Calls refused while open", ("upstream",))
+    for name, state in breaker_states().items():
+        open_.set(name, value=0 if state["state"] == CLOSED else 1)
+        trips.inc(name, amount=state["trips"])
+        rejected.inc(name, amount=state["rejected"])
+    return [open_, trips, rejected]
+
+
+metrics.registry.register_collector(_breaker_metrics)
+
+
+async def hedged(fn: Callable[[], Awaitable[T]], delay: float, attempts: int = 2) -> T:
+    """
+    Starts `fn`, and another attempt whenever none has succeeded within
+    `delay` seconds (or the latest one failed), up to `attempts` in total.
+    Returns the first success and cancels the rest.
+    """
+    tasks = [asyncio.ensure_future(fn())]
+    launched = 1
+    error = None
+    try:
+        while tasks:
+            done, _ = await asyncio.wait(
+                tasks, timeout=delay if launched < attempts else None,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                tasks.remove(task)
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+            if launched < attempts:
+                tasks.append(asyncio.ensure_future(fn()))
+                launched += 1
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import os
+import re
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+from database import get_db
+
+logger = logging.getLogger(__name__)
+
+# Search-as-you-type over product and equipment names. Every token of an
+# entry's searchable text is stored in one sorted list as
+# "token\x00kind\x00id", so a prefix lookup is a bisect plus a short forward
+# scan. Products are re-indexed whenever the catalog snapshot changes;
+# equipment is updated by the equipment routes and fully reloaded every
+# SUGGEST_REFRESH_SECONDS to pick up writes from other processes. Single adds
+# are buffered and merged into the sorted list on the next lookup or removal,
+# so a burst of creates costs one merge rather than a list shift per token.
+REFRESH_INTERVAL_SECONDS = float(os.getenv("SUGGEST_REFRESH_SECONDS", "300"))
+
+# Bound on keys examined per lookup, so short or unselective prefixes stay fast
+MAX_SCAN = 500
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_SEP = "\x00"
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._keys: List[str] = []
+        # Keys added since the last merge, not yet in _keys
+        self._pending: List[str] = []
+        self._entries: Dict[Tuple[str, str], dict] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _keys_for(self, kind: str, id: str, tokens: Iterable[str]) -> List[str]:
+        return [f"{t}{_SEP}{kind}{_SEP}{id}" for t in set(tokens)]
+
+    def _merge_pending(self):
+        # Both parts are runs the sort detects, so this is a linear merge
+        if self._pending:
+            self._pending.sort()
+            self._keys += self._pending
+            self._keys.sort()
+            self._pending = []
+
+    def add(self, kind: str, id: str, label: str, detail: str, text: str):
+        self.remove(kind, id)
+        tokens = tokenize(text)
+        self._entries[(kind, id)] = {"kind": kind, "id": id, "label": label, "detail": detail, "tokens": tokens}
+        self._pending.extend(self._keys_for(kind, id, tokens))
+
+    def remove(self, kind: str, id: str):
+        entry = self._entries.pop((kind, id), None)
+        if not entry:
+            return
+        self._merge_pending()
+        for key in self._keys_for(kind, id, entry["tokens"]):
+            i = bisect_left(self._keys, key)
+            if i < len(self._keys) and self._keys[i] == key:
+                del self._keys[i]
+
+    def replace_kind(self, kind: str, items: Iterable[Tuple[str, str, str, str]]):
+        """Swaps every entry of `kind` for (id, label, detail, text) items in one sort."""
+        self._merge_pending()
+        entries = {k: v for k, v in self._entries.items() if k[0] != kind}
+        keys = [key for key in self._keys if key.split(_SEP, 2)[1] != kind]
+        for id, label, detail, text in items:
+            tokens = tokenize(text)
+            entries[(kind, id)] = {"kind": kind, "id": id, "label": label, "detail": detail, "tokens": tokens}
+            keys.extend(self._keys_for(kind, id, tokens))
+        keys.sort()
+        self._keys, self._entries = keys, entries
+
+    def suggest(self, q: str, limit: int = 10, kind: Optional[str] = None) -> List[dict]:
+        """
+        Entries whose tokens cover every word of `q` as a prefix
+        ("power til" -> Power Tiller). The longest word drives the scan.
+        """
+        words = tokenize(q)
+        if not words:
+            return []
+        self._merge_pending()
+        longest = max(range(len(words)), key=lambda n: len(words[n]))
+        prefix, others = words[longest], words[:longest] + words[longest + 1:]
+
+        results, seen = [], set()
+        i = bisect_left(self._keys, prefix)
+        end = min(len(self._keys), i + MAX_SCAN)
+        while i < end and len(results) < limit:
+            key = self._keys[i]
+            i += 1
+            if not key.startswith(prefix):
+                break
+            _, entry_kind, entry_id = key.split(_SEP, 2)
+            if (kind and entry_kind != kind) or (entry_kind, entry_id) in seen:
+                continue
+            seen.add((entry_kind, entry_id))
+            entry = self._entries[(entry_kind, entry_id)]
+            if all(any(t.startswith(w) for t in entry["tokens"]) for w in others):
+                results.append({k: entry[k] for k in ("kind", "id", "label", "detail")})
+        return results
+
+
+def _product_item(p) -> Tuple[str, str, str, str]:
+    return str(p.id), p.name, p.seller, f"{p.name} {p.seller}"
+
+
+def _equipment_item(doc: dict) -> Tuple[str, str, str, str]:
+    equipment_type = doc.get("equipment_type", "")
+    description = doc.get("description", "")
+    return str(doc["_id"]), equipment_type, description[:80], f"{equipment_type} {description}"
+
+
+class SuggestService:
+    def __init__(self):
+        self.index = PrefixIndex()
+        self._catalog_version = None
+        self._task: Optional[asyncio.Task] = None
+
+    def sync_products(self, snapshot):
+        """Re-indexes products when the catalog snapshot has changed."""
+        if snapshot.version != self._catalog_version:
+            self.index.replace_kind("product", (_product_item(p) for p in snapshot.products))
+            self._catalog_version = snapshot.version
+
+    def add_equipment(self, doc: dict):
+        self.index.add("equipment", *_equipment_item(doc))
+
+    def remove_equipment(self, equipment_id):
+        self.index.remove("equipment", str(equipment_id))
+
+    async def reload_equipment(self):
+        docs = await get_db()["equipment"].find(
+            {}, {"equipment_type": 1, "description": 1}
+        ).to_list(length=None)
+        self.index.replace_kind("equipment", (_equipment_item(d) for d in docs))
+
+    async def _reload_periodically(self):
+        while True:
+            await asyncio.sleep(REFRESH_INTERVAL_SECONDS)
+            try:
+                await self.reload_equipment()
+            except Exception as e:
+                logger.warning(f"Suggest index refresh failed: {e}")
+
+    async def start(self):
+        try:
+            await self.reload_equipment()
+        except Exception as e:
+            logger.warning(f"Initial suggest index load failed: {e}")
+        self._task = asyncio.create_task(self._reload_periodically())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+suggestions = SuggestService()
@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+from pymongo import UpdateOne
+from app.services.cache import TTLCache
+
+# One document per tag:
+#   {_id: tag, post_count, last_post_at, daily: {"YYYY-MM-DD": n}}
+# Each post counts towards the day it was created on, so create, update and
+# delete can all adjust the same bucket without reading other posts.
+TAG_STATS = "tag_stats"
+RETENTION_DAYS = 30
+TRENDING_TTL_SECONDS = 60
+
+_trending_cache = TTLCache(maxsize=64, ttl=TRENDING_TTL_SECONDS)
+
+
+def clean_tags(tags: Optional[Iterable[str]]) -> List[str]:
+    """Stripped, lowercased tags in their original order, without duplicates."""
+    return list(dict.fromkeys(t.strip().lower() for t in tags or [] if t and t.strip()))
+
+
+def normalize_tags(tags: Optional[Iterable[str]]) -> set:
+    return set(clean_tags(tags))
+
+
+def _day_key(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%d")
+
+
+async def apply_tag_delta(db, added: Iterable[str], removed: Iterable[str], created_at: datetime):
+    """Adjusts tag counters for a post created at `created_at`."""
+    in_window = created_at >= datetime.utcnow() - timedelta(days=RETENTION_DAYS)
+    daily_field = f"daily.{_day_key(created_at)}"
+
+    ops = []
+    for tag in added:
+        inc = {"post_count": 1}
+        if in_window:
+            inc[daily_field] = 1
+        ops.append(UpdateOne(
+            {"_id": tag},
+            {"$inc": inc, "$max": {"last_post_at": created_at}},
+            upsert=True
+        ))
+    for tag in removed:
+        inc = {"post_count": -1}
+        if in_window:
+            inc[daily_field] = -1
+        ops.append(UpdateOne({"_id": tag}, {"$inc": inc}))
+
+    if ops:
+        await db[TAG_STATS].bulk_write(ops, ordered=False)
+
+
+async def record_post_tags(db, old_tags, new_tags, created_at: datetime):
+    """Applies the difference between a post's old and new tag lists."""
+    old, new = normalize_tags(old_tags), normalize_tags(new_tags)
+    await apply_tag_delta(db, new - old, old - new, created_at)
+
+
+async def get_trending_tags(db, window_days: int = 7, limit: int = 10) -> List[dict]:
+    """
+    Ranks tags by posts created in the last `window_days` days.
+    Results are cached for TRENDING_TTL_SECONDS.
+    """
+    cache_key = (window_days, limit)
+    cached = _trending_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    now = datetime.utcnow()
+    window_start = _day_key(now - timedelta(days=window_days - 1))
+    retention_start = _day_key(now - timedelta(days=RETENTION_DAYS))
+
+    docs = await db[TAG_STATS].find(
+        {"last_post_at": {"$gte": now - timedelta(days=window_days)}}
+    ).to_list(length=None)
+
+    trending, prune = [], []
+    for doc in docs:
+        daily = doc.get("daily", {})
+        recent = sum(n for day, n in daily.items() if day >= window_start)
+        if recent > 0:
+            trending.append({"tag": doc["_id"], "recent_posts": recent, "total_posts": doc.get("post_count", 0)})
+
+        stale = {f"daily.{day}": "" for day in daily if day < retention_start}
+        if stale:
+            prune.append(UpdateOne({"_id": doc["_id"]}, {"$unset": stale}))
+
+    # Piggyback pruning of expired day buckets on the (cached) refresh
+    if prune:
+        await db[TAG_STATS].bulk_write(prune, ordered=False)
+
+    trending.sort(key=lambda t: (-t["recent_posts"], -t["total_posts"], t["tag"]))
+    trending = trending[:limit]
+    _trending_cache.set(cache_key, trending)
+    return trending
+
+
+async def rebuild_tag_stats(db):
+    """Recomputes tag_stats from scratch with one pass over community_posts."""
+    cutoff = datetime.utcnow() - timedelta(days=RETENTION_DAYS)
+    pipeline = [
+        # Deleted posts don't count, and each post counts a tag once after
+        # normalization, as in the incremental path
+        {"$match": {"deleted_at": None}},
+        {"$project": {"created_at": 1, "tags": {"$setUnion": [
+            {"$map": {"input": "$tags", "in": {"$toLower": {"$trim": {"input": "$$this"}}}}}, []
+        ]}}},
+        {"$unwind": "$tags"},
+        {"$group": {
+            "_id": {"tag": "$tags",
+                    "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}},
+            "count": {"$sum": 1},
+            "last_post_at": {"$max": "$created_at"},
+        }},
+    ]
+
+    stats = {}
+    async for row in db["community_posts"].aggregate(pipeline):
+        tag, day = row["_id"]["tag"], row["_id"]["day"]
+        if not tag:
+            continue
+        entry = stats.setdefault(tag, {"_id": tag, "post_count": 0, "last_post_at": row["last_post_at"], "daily": {}})
+        entry["post_count"] += row["count"]
+        entry["last_post_at"] = max(entry["last_post_at"], row["last_post_at"])
+        if day >= _day_key(cutoff):
+            entry["daily"][day] = row["count"]
+
+    await db[TAG_STATS].delete_many({})
+    if stats:
+        await db[TAG_STATS].insert_many(list(stats.values()))
+    _trending_cache.clear()
+    return len(stats)
@@ -0,0 +1,130 @@
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from dotenv import load_dotenv
+from database import connect_to_mongo, close_mongo_connection, get_db
+from app.services.community_search import (
+    TEXT_INDEX_NAME, TEXT_INDEX_FIELDS, TEXT_INDEX_WEIGHTS,
+    build_search_pipeline, split_page
+)
+
+load_dotenv()
+
+# Benchmarks /community/search over a synthetic corpus stored in a separate
+# collection, so it can run against a dev database without touching real posts.
+BENCH_COLLECTION = "community_posts_bench"
+
+CROPS = ["wheat", "rice", "cotton", "maize", "sugarcane", "onion", "tomato", "potato", "soybean", "mustard"]
+TOPICS = ["fertilizer", "irrigation", "pests", "subsidy", "market-price", "seeds", "tractor", "organic", "monsoon", "soil"]
+WORDS = (
+    "yield sowing harvest drip sprinkler urea dap potash neem aphids whitefly blight rust "
+    "mandi price loan insurance scheme canal borewell solar pump rotavator harvester weeding "
+    "mulching compost vermicompost germination spacing nursery transplanting drought flood"
+).split()
+
+QUERIES = ["wheat fertilizer", "drip irrigation subsidy", "aphids cotton", "onion price", "solar pump",
+           "organic compost", "rice blight", "tractor rotavator", "monsoon sowing", "borewell loan"]
+
+
+def make_post(rng: random.Random, now: datetime):
+    crop = rng.choice(CROPS)
+    topic = rng.choice(TOPICS)
+    body = " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 80)))
+    return {
+        "_id": ObjectId(),
+        "title": f"{crop.title()} {topic} question {rng.randint(1, 10_000)}",
+        "content": f"{crop} {topic} {body}",
+        "tags": [crop, topic],
+        "author_id": ObjectId(),
+        "author_name": "Bench Farmer",
+        "created_at": now - timedelta(minutes=rng.randint(0, 525_600)),
+        "upvotes": rng.randint(0, 50),
+        "downvotes": rng.randint(0, 5),
+        "comment_count": rng.randint(0, 20),
+    }
+
+
+async def seed(collection, total: int, batch_size: int = 5000):
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    existing = await collection.estimated_document_count()
+    if existing >= total:
+        print(f"Corpus already has {existing} posts, skipping seed.")
+        return
+
+    print(f"Seeding {total - existing} posts...")
+    start = time.perf_counter()
+    remaining = total - existing
+    while remaining > 0:
+        n = min(batch_size, remaining)
+        await collection.insert_many([make_post(rng, now) for _ in range(n)], ordered=False)
+        remaining -= n
+    print(f"Seeded in {time.perf_counter() - start:.1f}s")
+
+    print("Building text index...")
+    start = time.perf_counter()
+    await collection.create_index(TEXT_INDEX_FIELDS, name=TEXT_INDEX_NAME, weights=TEXT_INDEX_WEIGHTS)
+    print(f"Index built in {time.perf_counter() - start:.1f}s")
+
+
+async def run_query(collection, q: str, tags=None, cursor=None, limit: int = 20):
+    pipeline = build_search_pipeline(q, tags=tags, cursor=cursor, limit=limit)
+    facets = await collection.aggregate(pipeline).to_list(length=1)
+    return split_page(facets[0]["results"], limit) if facets else ([], None)
+
+
+def report(label: str, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{label:<28} n={len(samples):<5} p50={statistics.median(samples):7.1f}ms "
+          f"p95={p95:7.1f}ms max={samples[-1]:7.1f}ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark community post search")
+    parser.add_argument("--posts", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--drop", action="store_true", help="Drop the bench collection when done")
+    args = parser.parse_args()
+
+    await connect_to_mongo()
+    collection = get_db()[BENCH_COLLECTION]
+    try:
+        await seed(collection, args.posts)
+
+        first_page, tagged, deep = [], [], []
+        for i in range(args.queries):
+            q = QUERIES[i % len(QUERIES)]
+
+            start = time.perf_counter()
+            _, cursor = await run_query(collection, q)
+            first_page.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            await run_query(collection, q, tags=[q.split()[0]])
+            tagged.append((time.perf_counter() - start) * 1000)
+
+            # Walk a few pages to show keyset paging doesn't degrade with depth
+            for _ in range(5):
+                if not cursor:
+                    break
+                start = time.perf_counter()
+                _, cursor = await run_query(collection, q, cursor=cursor)
+                deep.append((time.perf_counter() - start) * 1000)
+
+        report("first page + facets", first_page)
+        report("tag filtered", tagged)
+        if deep:
+            report("pages 2-6 (keyset)", deep)
+    finally:
+        if args.drop:
+            await collection.drop()
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+import argparse
+import asyncio
+import time
+from fastapi import FastAPI
+from app.middleware.metrics import MetricsMiddleware, LATENCY, REQUESTS
+
+# Cost of the /metrics instrumentation per request, driven over raw ASGI (no
+# HTTP client or server in the loop). A FastAPI request alone costs ~100 us
+# and varies by more than the middleware adds, so the overhead is measured
+# around a bare ASGI app that only sets the matched route and responds, the
+# way FastAPI would. The FastAPI numbers are printed for scale. Expect 3-6 us
+# of overhead, about 1 us of it from wrapping `send`; runs vary by ~1 us.
+
+app = FastAPI()
+
+
+@app.get("/items/{item_id}")
+async def item(item_id: int):
+    return {"id": item_id}
+
+
+ROUTE = app.routes[-1]
+START = {"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]}
+BODY = {"type": "http.response.body", "body": b'{"id":7}'}
+
+
+async def bare_app(scope, receive, send):
+    scope["route"] = ROUTE
+    await send(START)
+    await send(BODY)
+
+
+def _scope():
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/items/7", "raw_path": b"/items/7", "root_path": "",
+        "query_string": b"", "headers": [], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(message):
+    pass
+
+
+async def per_request_us(asgi, rounds: int) -> float:
+    for _ in range(200):
+        await asgi(_scope(), _receive, _send)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await asgi(_scope(), _receive, _send)
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def primitive_us(fn, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Per-request overhead of MetricsMiddleware")
+    parser.add_argument("--rounds", type=int, default=20_000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    # Interleave runs and keep the best of each, so noise doesn't favour either side
+    results = {"bare ASGI app": [], "+ MetricsMiddleware": [], "FastAPI route": []}
+    for _ in range(args.repeats):
+        results["bare ASGI app"].append(await per_request_us(bare_app, args.rounds))
+        results["+ MetricsMiddleware"].append(await per_request_us(MetricsMiddleware(bare_app), args.rounds))
+        results["FastAPI route"].append(await per_request_us(app, args.rounds // 10))
+    for name, times in results.items():
+        print(f"{name:20s}{min(times):7.2f} us/request")
+    overhead = min(results["+ MetricsMiddleware"]) - min(results["bare ASGI app"])
+    print(f"{'overhead':20s}{overhead:7.2f} us/request")
+
+    print(f"counter inc         {primitive_us(lambda: REQUESTS.inc('GET', '/items/{item_id}', '200'), 200_000):7.2f} us")
+    print(f"histogram observe   {primitive_us(lambda: LATENCY.observe(0.003, 'GET', '/items/{item_id}'), 200_000):7.2f} us")
+    # What the middleware uses: series resolved once per method and route
+    requests, latency = REQUESTS.labels("GET", "/items/{item_id}", "200"), LATENCY.labels("GET", "/items/{item_id}")
+    print(f"counter child inc   {primitive_us(requests.inc, 200_000):7.2f} us")
+    print(f"histogram child     {primitive_us(lambda: latency.observe(0.003), 200_000):7.2f} us")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
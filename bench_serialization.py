@@ -0,0 +1,130 @@
+import argparse
+import asyncio
+import base64
+import random
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+import httpx
+import logging
+import database
+from main import app
+
+# Per-request CPU for the heaviest list endpoints (/uber/equipment/nearby,
+# /community/posts, /store/products), measured through the real app and
+# FastAPI response handling. Mongo is replaced by an in-memory collection
+# that hands out fresh copies of canned documents, the way Motor would, so
+# the numbers are query-free: validation, encoding and framework overhead only.
+# The serialization cases ask for identity encoding so compression doesn't
+# drown them out; the gzip cases measure it separately.
+
+PHONE = "9000000001"
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    def skip(self, n):
+        return self
+
+    def limit(self, n):
+        return self
+
+    async def to_list(self, length=None):
+        return [dict(d) for d in self._docs[:length]]
+
+
+class _Collection:
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+
+    def find(self, *args, **kwargs):
+        return _Cursor(self.docs)
+
+    async def find_one(self, *args, **kwargs):
+        return dict(self.docs[0]) if self.docs else None
+
+
+def _image(rng, size):
+    return "data:image/jpeg;base64," + base64.b64encode(rng.randbytes(size)).decode()
+
+
+def fake_db(rng, count: int, image_bytes: int) -> dict:
+    user_id = ObjectId()
+    now = datetime.utcnow()
+    equipment = [{
+        "_id": ObjectId(), "owner_id": str(ObjectId()), "equipment_type": "Tractor",
+        "description": "50HP tractor with rotavator, serviced last month. " * 4,
+        "hourly_price": 500.0, "daily_price": 4000.0, "availability_status": "available",
+        "location": {"type": "Point", "coordinates": [75.85, 30.91]},
+        "images": [_image(rng, image_bytes)], "rating": 4.5, "review_count": 12,
+    } for _ in range(count)]
+    posts = [{
+        "_id": ObjectId(), "title": f"Yellowing leaves on wheat, plot {i}",
+        "content": "Noticed yellow patches spreading from the lower leaves after the last irrigation. " * 12,
+        "tags": ["wheat", "disease", "irrigation"], "author_id": ObjectId(), "author_name": "Farmer",
+        "author_mobile": "9000000002", "created_at": now - timedelta(minutes=i),
+        "upvotes": 3, "downvotes": 0, "comment_count": 5, "deleted_at": None,
+    } for i in range(count)]
+    products = [{
+        "_id": ObjectId(), "name": f"Hybrid Seed {i}", "category": "Seeds", "description": "High yield. " * 20,
+        "original_price": 1200.0, "our_price": 999.0, "discount": 201.0, "seller": "SeedCorp",
+        "image": _image(rng, image_bytes), "rating": 4.2, "stock": 50,
+    } for i in range(count)]
+    return {
+        "users": _Collection([{"_id": user_id, "mobile_number": PHONE, "role": "owner", "location": None}]),
+        "equipment": _Collection(equipment),
+        "community_posts": _Collection(posts),
+        "post_votes": _Collection(),
+        "products": _Collection(products),
+    }
+
+
+async def fetch(client, path: str, headers=None) -> int:
+    # Raw bytes, so the client doesn't spend CPU decompressing
+    async with client.stream("GET", path, headers=headers) as response:
+        assert response.status_code == 200, (path, response.status_code)
+        return sum([len(chunk) async for chunk in response.aiter_raw()])
+
+
+async def measure(client, path: str, rounds: int, headers=None):
+    size = await fetch(client, path, headers)
+    start = time.process_time()
+    for _ in range(rounds):
+        await fetch(client, path, headers)
+    return (time.process_time() - start) / rounds * 1000, size
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Per-request CPU of list endpoints")
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--image-bytes", type=int, default=20_000)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    database.db = fake_db(random.Random(7), args.items, args.image_bytes)
+    # Keep per-request access logs out of the output
+    logging.getLogger().setLevel(logging.WARNING)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        cases = [
+            ("/uber/equipment/nearby?lat=30.91&long=75.85", None),
+            ("/community/posts?limit=100", {"X-User-Phone": PHONE}),
+            ("/store/products", None),
+        ]
+        # httpx, like browsers, asks for gzip by default; repeated identical
+        # bodies should come from the compressed-body caches, not be recompressed
+        for label, encoding in (("serialization", "identity"), ("with gzip", "gzip")):
+            print(f"-- {label} (Accept-Encoding: {encoding})")
+            for path, headers in cases:
+                headers = {**(headers or {}), "Accept-Encoding": encoding}
+                cpu_ms, size = await measure(client, path, args.rounds, headers)
+                print(f"{path:48s} {cpu_ms:7.2f} ms CPU/request  ({size / 1024:.0f} KiB)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+import argparse
+import random
+import statistics
+import time
+from app.services.suggest import PrefixIndex
+
+# Microbenchmark for /search/suggest lookups. Pure in-memory, no database.
+
+NAMES = ["tractor", "tiller", "rotavator", "harvester", "sprayer", "seeder", "cultivator", "thresher",
+         "fertilizer", "urea", "potash", "compost", "wheat", "paddy", "mustard", "spade", "sickle", "pump"]
+BRANDS = ["mahindra", "sonalika", "swaraj", "kubota", "johndeere", "agribest", "greenearth", "seedcorp"]
+QUERIES = ["t", "tr", "trac", "tractor", "ha", "harv", "fert", "pow til", "joh", "k", "seedc", "zzz"]
+
+
+def build(n: int) -> PrefixIndex:
+    rng = random.Random(7)
+    index = PrefixIndex()
+    products, equipment = [], []
+    for i in range(n):
+        name = f"{rng.choice(BRANDS)} {rng.choice(NAMES)} {rng.randint(1, 99)}hp"
+        detail = rng.choice(BRANDS)
+        item = (str(i), name, detail, f"{name} {detail}")
+        (products if i % 2 else equipment).append(item)
+    index.replace_kind("product", products)
+    index.replace_kind("equipment", equipment)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prefix suggestions")
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = build(args.entries)
+    print(f"Built index of {len(index)} entries in {time.perf_counter() - start:.2f}s")
+
+    for q in QUERIES:
+        samples = []
+        for _ in range(args.rounds):
+            t0 = time.perf_counter_ns()
+            index.suggest(q, limit=10)
+            samples.append((time.perf_counter_ns() - t0) / 1000)
+        samples.sort()
+        print(f"q={q!r:<12} p50={statistics.median(samples):7.1f}us "
+              f"p99={samples[int(len(samples) * 0.99) - 1]:7.1f}us")
+
+    samples = []
+    for i in range(1000):
+        t0 = time.perf_counter_ns()
+        index.add("equipment", f"new-{i}", "power tiller", "", "power tiller 7hp")
+        samples.append((time.perf_counter_ns() - t0) / 1000)
+    print(f"single add         p50={statistics.median(samples):7.1f}us")
+
+
+if __name__ == "__main__":
+    main()
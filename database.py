@@ -1,6 +1,10 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from app.services.db_monitor import command_listener
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 client = None
 db = None
 
@@ -9,23 +13,27 @@ async def connect_to_mongo():
     mongo_url = os.getenv("MONGODB_URL")
     db_name = os.getenv("DB_NAME")
     if not mongo_url or not db_name:
-        print("MONGODB_URL or DB_NAME not set in .env")
+        logger.warning("MONGODB_URL or DB_NAME not set in .env")
         return
 
     try:
-        client = AsyncIOMotorClient(mongo_url)
+        # Feeds the per-collection Mongo metrics on /metrics
+        client = AsyncIOMotorClient(mongo_url, event_listeners=[command_listener])
         db = client[db_name]
         # Ping the database to check connection
         await client.admin.command('ping')
-        print(f"Connected to MongoDB: {db_name}")
+        logger.info(f"Connected to MongoDB: {db_name}")
     except Exception as e:
-        print(f"Error connecting to MongoDB: {e}")
+        logger.error(f"Error connecting to MongoDB: {e}")
 
 async def close_mongo_connection():
     global client
     if client:
         client.close()
-        print("MongoDB connection closed")
+        logger.info("MongoDB connection closed")
 
 def get_db():
     return db
+
+def get_client():
+    return client
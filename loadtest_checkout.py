@@ -0,0 +1,111 @@
+import argparse
+import asyncio
+import time
+import uuid
+import httpx
+from bson import ObjectId
+from dotenv import load_dotenv
+from database import connect_to_mongo, close_mongo_connection, get_db
+
+load_dotenv()
+
+# Flash-sale load test for POST /store/checkout against a running server
+# (uvicorn main:app). Creates a product with limited stock directly in the
+# database, gives every simulated user one unit in their cart, then fires all
+# checkouts at once. Every request is sent twice with the same Idempotency-Key
+# to mimic mobile retries.
+#
+# Expected: exactly `stock` orders succeed, the rest get 409, stock ends at 0
+# and never goes negative, and both sends of a buyer who got an order return
+# 200 with the same order id. The script exits non-zero otherwise.
+
+FLASH_PRODUCT = {
+    "name": "Flash Sale Sprayer",
+    "category": "Tools",
+    "description": "Load test product for checkout.",
+    "original_price": 1800.0,
+    "our_price": 999.0,
+    "discount": 801.0,
+    "seller": "LoadTest",
+    "image": "",
+    "rating": 0.0,
+}
+
+
+async def setup(client: httpx.AsyncClient, users: int, stock: int):
+    db = get_db()
+    result = await db["products"].insert_one({**FLASH_PRODUCT, "stock": stock})
+    product_id = str(result.inserted_id)
+
+    phones = [f"70000{i:05d}" for i in range(users)]
+    for phone in phones:
+        await client.post("/register", json={"mobile_number": phone})
+        await client.post("/store/cart/batch", headers={"X-User-Phone": phone},
+                          json={"changes": [{"product_id": product_id, "op": "set", "quantity": 1}]})
+    return product_id, phones
+
+
+async def checkout(client: httpx.AsyncClient, phone: str, key: str):
+    start = time.perf_counter()
+    response = await client.post("/store/checkout", headers={"X-User-Phone": phone, "Idempotency-Key": key})
+    return response.status_code, time.perf_counter() - start, response
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Concurrent checkout load test")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--stock", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+
+    await connect_to_mongo()
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60.0) as client:
+        product_id, phones = await setup(client, args.users, args.stock)
+        print(f"Product {product_id}: {args.stock} units, {len(phones)} buyers")
+
+        keys = {phone: str(uuid.uuid4()) for phone in phones}
+        # Each buyer checks out twice with the same key, interleaved
+        calls = [checkout(client, phone, keys[phone]) for phone in phones for _ in range(2)]
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*calls)
+        elapsed = time.perf_counter() - start
+
+    latencies = sorted(r[1] for r in results)
+    by_status = {}
+    for status, _, _ in results:
+        by_status[status] = by_status.get(status, 0) + 1
+
+    # Calls are (first, retry) pairs per buyer; a placed order must come back from both
+    mismatched = []
+    for i, phone in enumerate(phones):
+        (first, _, first_response), (retry, _, retry_response) = results[2 * i], results[2 * i + 1]
+        if 200 not in (first, retry):
+            continue
+        if first != retry or first_response.json()["_id"] != retry_response.json()["_id"]:
+            mismatched.append((phone, first, retry))
+
+    db = get_db()
+    product = await db["products"].find_one({"_id": ObjectId(product_id)})
+    order_count = await db["orders"].count_documents({"items.product_id": product_id})
+
+    print(f"{len(results)} requests in {elapsed:.2f}s -> {len(results) / elapsed:.1f} req/s")
+    print(f"p50={latencies[len(latencies) // 2] * 1000:.0f}ms p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f}ms")
+    print(f"Status codes: {by_status}")
+    print(f"Orders placed: {order_count} (expected {min(args.stock, args.users)}), final stock: {product['stock']}")
+    print(f"Buyers whose two sends disagreed: {len(mismatched)}")
+    for phone, first, retry in mismatched[:10]:
+        print(f"  {phone}: {first} / {retry}")
+
+    await db["products"].delete_one({"_id": product["_id"]})
+    await close_mongo_connection()
+
+    assert not mismatched, "an idempotent retry did not return the original order"
+    assert order_count == min(args.stock, args.users), "wrong number of orders placed"
+    assert product["stock"] == max(args.stock - args.users, 0), "stock out of step with orders"
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
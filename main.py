@@ -2,43 +2,117 @@ from fastapi import FastAPI
 from dotenv import load_dotenv
 from contextlib import asynccontextmanager
 from database import connect_to_mongo, close_mongo_connection, get_db
-from app.routers import harvest, equipment, booking, review, auth, community, store
+from app.routers import harvest, equipment, booking, review, auth, community, store, search, advisory, metrics
+from app.services.community_search import TEXT_INDEX_NAME, TEXT_INDEX_FIELDS, TEXT_INDEX_WEIGHTS
+from app.services.post_cleanup import DELETION_JOBS, start_deletion_worker, stop_deletion_worker
+from app.services.comment_paths import backfill_comment_paths
+from app.services.feed_stream import feed
+from app.services.catalog import catalog
+from app.services.product_query import PRODUCT_SORT_INDEXES, DISCOUNT_BACKFILL, DISCOUNT_STALE
+from app.services.suggest import suggestions
+from app.services.http_client import start_http_client, close_http_client
+from app.services.recommendation_cache import CACHE_COLLECTION as GEMINI_CACHE
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.conditional import ConditionalGetMiddleware
+from app.middleware.metrics import MetricsMiddleware
+from app.middleware.db_timing import DbTimingMiddleware
+from app.middleware.profiling import ProfilingMiddleware, profiling_enabled
+from app.middleware.request_log import RequestLogMiddleware
+from app.log import setup_logging
+from app.services.advisories import ADVISORIES, start_advisory_scheduler, stop_advisory_scheduler
+import logging
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
+setup_logging()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await connect_to_mongo()
+    await start_http_client()
     
     # Create geospatial index
     db = get_db()
     try:
         await db["equipment"].create_index([("location", "2dsphere")])
-        print("Created 2dsphere index on equipment.location")
+        logger.info("Created 2dsphere index on equipment.location")
         
         # Create unique index for users phone
         await db["users"].create_index("mobile_number", unique=True)
-        print("Created unique index on users.mobile_number")
+        logger.info("Created unique index on users.mobile_number")
         # Community Indexes
         await db["community_posts"].create_index("created_at")
         await db["community_posts"].create_index([("upvotes", -1), ("created_at", -1)])
-        await db["community_comments"].create_index("post_id")
+        await db["community_posts"].create_index(
+            TEXT_INDEX_FIELDS, name=TEXT_INDEX_NAME, weights=TEXT_INDEX_WEIGHTS
+        )
+        await db["tag_stats"].create_index("last_post_at")
+        await db["community_comments"].create_index([("post_id", 1), ("path", 1)])
         await db["community_comments"].create_index("created_at")
+        # Pre-threading comments are invisible to get_comments until they have a path
+        backfilled = await backfill_comment_paths(db)
+        if backfilled:
+            logger.info(f"Backfilled paths on {backfilled} comments")
         
         await db["post_votes"].create_index([("user_id", 1), ("post_id", 1)], unique=True)
         await db["comment_votes"].create_index([("user_id", 1), ("comment_id", 1)], unique=True)
+        # Used by the cascade when a post is deleted
+        await db["post_votes"].create_index("post_id")
+        await db["comment_votes"].create_index("comment_id")
+        await db[DELETION_JOBS].create_index("created_at")
         
-        print("Created community indexes")
+        logger.info("Created community indexes")
+
+        # Store browse: one index per sort key, discount materialized for sorting
+        for index in PRODUCT_SORT_INDEXES:
+            await db["products"].create_index(index)
+        await db["products"].update_many(DISCOUNT_STALE, DISCOUNT_BACKFILL)
+        # Cart mutations upsert by user_id, so it must stay unique
+        await db["carts"].create_index("user_id", unique=True)
+        # Makes checkout retries with the same Idempotency-Key safe
+        await db["orders"].create_index(
+            [("user_id", 1), ("idempotency_key", 1)], unique=True,
+            partialFilterExpression={"idempotency_key": {"$type": "string"}}
+        )
+        # Persistent Gemini cache entries expire on their own
+        await db[GEMINI_CACHE].create_index("expires_at", expireAfterSeconds=0)
+        # One advisory per user and crop; /api/advisories/me reads by user_id
+        await db[ADVISORIES].create_index([("user_id", 1), ("crop_type", 1)], unique=True)
+        await db[ADVISORIES].create_index("computed_at")
     except Exception as e:
-        print(f"Error creating index: {e}")
+        logger.error(f"Error creating index: {e}")
+
+    # Resumes any cascade deletes left unfinished by a previous run
+    start_deletion_worker()
+    await catalog.start()
+    await suggestions.start()
+    start_advisory_scheduler()
         
     yield
     # Shutdown
+    await stop_advisory_scheduler()
+    await suggestions.stop()
+    await catalog.stop()
+    await feed.stop()
+    await stop_deletion_worker()
+    await close_http_client()
     await close_mongo_connection()
 
 app = FastAPI(lifespan=lifespan)
 
+app.add_middleware(DbTimingMiddleware)
+# ETags are computed on the uncompressed body, so this must run inside compression
+app.add_middleware(ConditionalGetMiddleware)
+app.add_middleware(CompressionMiddleware)
+# Outside compression, so latency includes it
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestLogMiddleware)
+# Only installed when configured, so unprofiled deployments pay nothing
+if profiling_enabled():
+    app.add_middleware(ProfilingMiddleware)
+
 app.include_router(harvest.router)
 app.include_router(equipment.router)
 app.include_router(booking.router)
@@ -46,6 +120,9 @@ app.include_router(review.router)
 app.include_router(auth.router)
 app.include_router(community.router)
 app.include_router(store.router)
+app.include_router(search.router)
+app.include_router(advisory.router)
+app.include_router(metrics.router)
 
 @app.get("/")
 async def root():
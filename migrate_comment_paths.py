@@ -0,0 +1,26 @@
+import asyncio
+from database import connect_to_mongo, get_db, close_mongo_connection
+from app.services.comment_paths import backfill_comment_paths
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# The API also runs this backfill at startup; the script is for doing it
+# ahead of a deploy.
+
+async def migrate_comment_paths():
+    await connect_to_mongo()
+    db = get_db()
+    
+    print("Backfilling materialized paths on top-level comments...")
+    try:
+        updated = await backfill_comment_paths(db)
+        print(f"Updated {updated} comments.")
+        
+    except Exception as e:
+        print(f"Error: {e}")
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(migrate_comment_paths())
@@ -0,0 +1,22 @@
+import asyncio
+from database import connect_to_mongo, get_db, close_mongo_connection
+from app.services.tag_stats import rebuild_tag_stats
+from dotenv import load_dotenv
+
+load_dotenv()
+
+async def main():
+    await connect_to_mongo()
+    db = get_db()
+    
+    print("Rebuilding tag_stats from community_posts...")
+    try:
+        count = await rebuild_tag_stats(db)
+        print(f"Wrote stats for {count} tags.")
+    except Exception as e:
+        print(f"Error: {e}")
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
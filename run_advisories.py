@@ -0,0 +1,41 @@
+import argparse
+import asyncio
+import time
+from database import connect_to_mongo, get_db, close_mongo_connection
+from app.services.advisories import run_advisories, BATCH_SIZE, CONCURRENCY
+from app.services.http_client import start_http_client, close_http_client
+from app.log import setup_logging
+from dotenv import load_dotenv
+
+load_dotenv()
+# Job errors from app code come through the logging queue
+setup_logging()
+
+# Runs the advisory job once, e.g. from cron when ADVISORY_RUN_HOUR_UTC is
+# left empty for the API processes.
+
+async def main():
+    parser = argparse.ArgumentParser(description="Precompute harvest advisories")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    args = parser.parse_args()
+
+    await connect_to_mongo()
+    await start_http_client()
+    db = get_db()
+
+    start = time.perf_counter()
+    try:
+        written = await run_advisories(db, args.batch_size, args.concurrency)
+        if written is None:
+            print("Another advisory run holds the lock; nothing done.")
+        else:
+            print(f"Wrote {written} advisories in {time.perf_counter() - start:.1f}s.")
+    except Exception as e:
+        print(f"Error: {e}")
+    finally:
+        await close_http_client()
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -110,6 +110,8 @@ async def seed_products():
         else:
             # Fallback placeholder if local image fails
             p["image"] = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=="
+        # Materialized so /store/products/browse can sort on an index
+        p["discount"] = p["original_price"] - p["our_price"]
         products_to_insert.append(p)
 
     # Insert new products
@@ -0,0 +1,104 @@
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from fastapi import FastAPI, HTTPException, Request
+from typing import Optional
+
+# Local stand-ins for the OpenWeatherMap forecast API and Gemini, for
+# exercising the harvest endpoint without network access or API keys:
+#
+#   uvicorn stub_upstreams:app --port 8001
+#   WEATHER_API_URL=http://127.0.0.1:8001/data/2.5/forecast WEATHER_API_KEY=stub \
+#   GEMINI_API_ENDPOINT=http://127.0.0.1:8001 GEMINI_API_KEY=stub uvicorn main:app
+#
+# Forecasts are deterministic per location; GET /_stats shows how many
+# upstream calls actually reached the stub (e.g. to confirm caching).
+# Latency and errors can be injected per upstream at runtime:
+#
+#   curl -X POST "http://127.0.0.1:8001/_faults/weather?latency=3&error_rate=0.5"
+#   curl -X POST "http://127.0.0.1:8001/_faults/gemini?latency=0&error_rate=0"
+
+app = FastAPI(title="Farmora upstream stubs")
+
+calls = {"weather": 0, "gemini": 0}
+faults = {"weather": {"latency": 0.0, "error_rate": 0.0}, "gemini": {"latency": 0.0, "error_rate": 0.0}}
+
+
+def _seed(*parts) -> int:
+    return int(hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()[:8], 16)
+
+
+async def _inject(upstream: str):
+    calls[upstream] += 1
+    fault = faults[upstream]
+    if fault["latency"]:
+        await asyncio.sleep(fault["latency"])
+    if random.random() < fault["error_rate"]:
+        raise HTTPException(status_code=503, detail=f"Injected {upstream} failure")
+
+
+@app.get("/data/2.5/forecast")
+async def forecast(
+    appid: str,
+    q: Optional[str] = None,
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+    units: str = "metric"
+):
+    await _inject("weather")
+    seed = _seed(q, lat, lon)
+    # About a quarter of locations get a thunderstorm (2xx) in the forecast
+    storm_slot = 10 if seed % 4 == 0 else None
+    now = int(time.time())
+    items = []
+    for i in range(40):
+        value = _seed(seed, i)
+        items.append({
+            "dt": now + i * 3 * 3600,
+            "main": {"temp": 18 + value % 15},
+            "pop": (value % 100) / 100,
+            "wind": {"speed": round((value % 150) / 10, 1)},
+            "weather": [{"id": 211 if i == storm_slot else 800}],
+        })
+    return {"cod": "200", "cnt": len(items), "list": items}
+
+
+@app.post("/v1beta/models/{model_action}")
+async def generate_content(model_action: str, request: Request):
+    """Minimal Gemini generateContent: a fixed-shape JSON recommendation."""
+    if not model_action.endswith(":generateContent"):
+        raise HTTPException(status_code=404, detail="Not found")
+    await _inject("gemini")
+    body = await request.json()
+    prompt = " ".join(p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", []))
+    match = re.search(r"Maturity Percentage: ([\d.]+)%", prompt)
+    maturity = float(match.group(1)) if match else 0.0
+    storm = "Storm Alert: True" in prompt
+    answer = {
+        "maturity_status": f"{maturity}% mature",
+        "weather_risk_level": "HIGH" if storm else "MEDIUM",
+        "recommendation": "HARVEST NOW" if maturity >= 78 else "WAIT",
+        "reasoning": "Stub recommendation.",
+        "farmer_advice": "Stub advice.",
+    }
+    return {"candidates": [{
+        "content": {"role": "model", "parts": [{"text": json.dumps(answer)}]},
+        "finishReason": "STOP",
+        "index": 0,
+    }]}
+
+
+@app.post("/_faults/{upstream}")
+async def set_faults(upstream: str, latency: float = 0.0, error_rate: float = 0.0):
+    if upstream not in faults:
+        raise HTTPException(status_code=404, detail="Unknown upstream")
+    faults[upstream] = {"latency": latency, "error_rate": error_rate}
+    return faults
+
+
+@app.get("/_stats")
+async def stats():
+    return calls